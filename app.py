@@ -1,88 +1,571 @@
 """Flask web application for extracting events from text and adding to Google Calendar."""
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.utils import secure_filename
+import functools
+import hashlib
+import multiprocessing
 import os
+import shutil
+import tempfile
+import threading
+import logging
+import time
+import uuid
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-import json
-from datetime import datetime
+from urllib.parse import unquote
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+import orjson
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import Flow
 
-from parsers import extract_events_from_text, extract_events_with_gemini
-from calendar_utils import create_google_service_from_credentials, create_google_event, create_calendar
+from parsers import iter_events_from_text, extract_events_with_gemini
+from calendar_utils import SCOPES, AUTH_REQUEST, CALENDAR_NAMING_CHARS, build_service, create_google_service_from_credentials, create_google_events_batch, create_calendar
 from image_processor import extract_events_from_image, get_supported_image_formats
 
+try:
+    import pymupdf
+except ImportError:
+    # Optional fast path for PDF text extraction; pdfplumber is used otherwise
+    pymupdf = None
+
+# pdfplumber is only needed when PyMuPDF is missing or fails; see _load_pdfplumber()
+pdfplumber = None
+_pdfplumber_lock = threading.Lock()
+
+try:
+    from ciso8601 import parse_datetime
+except ImportError:
+    # Optional C parser for stored ISO 8601 event times
+    parse_datetime = datetime.fromisoformat
+
+try:
+    from streaming_form_data import StreamingFormDataParser
+    from streaming_form_data.targets import FileTarget
+except ImportError:
+    # Optional: multipart uploads fall back to Werkzeug's form parser
+    StreamingFormDataParser = None
+
 # Load environment variables from .env file
 load_dotenv()
 
+# LOG_LEVEL=DEBUG turns on the per-request debug logging
+logging.basicConfig(
+    level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
+log = logging.getLogger(__name__)
+
 # Allow HTTP for localhost OAuth (development only!)
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
+
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson, used for jsonify() and the session cookie."""
+    
+    def _dumps_bytes(self, obj, sort_keys, indent, default):
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=default, option=option)
+    
+    def dumps(self, obj, **kwargs):
+        return self._dumps_bytes(
+            obj,
+            kwargs.get('sort_keys', self.sort_keys),
+            kwargs.get('indent'),
+            kwargs.get('default', self.default),
+        ).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        """Build the jsonify() response straight from orjson's bytes, skipping the str round-trip."""
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = self._dumps_bytes(obj, self.sort_keys, indent, self.default)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
 app = Flask(__name__, static_folder='assets')
+app.json = ORJSONProvider(app)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp'}
+IMAGE_EXTENSIONS = frozenset(fmt.lstrip('.') for fmt in get_supported_image_formats())
+ALLOWED_EXTENSIONS = frozenset({'txt', 'pdf'}) | IMAGE_EXTENSIONS
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB chunks when streaming raw uploads to disk
+CLIENT_SECRETS_FILE = 'credentials.json'
+
+# Create upload folder if it doesn't exist; resolved once so upload paths never depend on the cwd
+UPLOAD_DIR = Path(UPLOAD_FOLDER).resolve()
+UPLOAD_DIR.mkdir(exist_ok=True)
+
+# Uploaded files and their stored events/text are removed after this long
+UPLOAD_MAX_AGE = 24 * 60 * 60
+UPLOAD_CLEANUP_INTERVAL = 60 * 60  # seconds between cleanup sweeps
+_last_upload_cleanup = 0.0
+
+# Background extraction jobs for async uploads (see run_upload_job)
+UPLOAD_JOB_WORKERS = int(os.environ.get('UPLOAD_JOB_WORKERS', '4'))
+_upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_JOB_WORKERS, thread_name_prefix='upload-job')
+UPLOAD_JOBS = {}  # upload ID -> Future for jobs started by this process
+# A job not running in this process and untouched for this long is reported as failed:
+# its worker restarted or crashed, or the job was cancelled, before it stored a result
+UPLOAD_JOB_TIMEOUT = 10 * 60
+
+# pdfplumber fallback: PDFs with at least this many pages are split across a process pool
+PDF_PARALLEL_MIN_PAGES = 4
+PDF_MAX_WORKERS = os.cpu_count() or 1
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
 
-# Create upload folder if it doesn't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Per-process LRU of extracted events (with datetime objects), keyed by upload ID
+EVENTS_CACHE_MAX_ENTRIES = 64
+_EVENTS_CACHE = OrderedDict()
+_events_cache_lock = threading.Lock()
+
+# Per-process cache of userinfo responses, keyed by a digest of the access token
+USER_INFO_TTL = 600  # seconds before a cached userinfo response is refetched
+AUTH_CACHE_MAX_ENTRIES = 256
+_AUTH_CACHE = {}
+
+# Per-user refresh locks and the latest token each refresh produced, keyed by _refresh_key()
+_REFRESH_LOCKS = {}
+_REFRESHED_TOKENS = {}
+_refresh_registry_lock = threading.Lock()
+
+# Session token fields needed to rebuild Credentials
+REQUIRED_TOKEN_FIELDS = ('token', 'token_uri', 'client_id', 'client_secret')
+# Treat tokens this close to expiry as stale (google-auth refreshes 3m45s early)
+TOKEN_EXPIRY_MARGIN = timedelta(minutes=5)
+# How long after expiry /auth-status still reports signed in when a refresh fails on the network
+REFRESH_GRACE_PERIOD = timedelta(minutes=10)
+# /create-events refreshes tokens expiring within this window, so a long import never refreshes mid-batch
+IMPORT_REFRESH_MARGIN = timedelta(minutes=15)
+
+
+def get_file_extension(filename):
+    """Return the lowercase extension of filename without the dot, or '' if it has none."""
+    # rpartition returns a fixed 3-tuple; sep is '' when there is no dot
+    _, sep, ext = filename.rpartition('.')
+    return ext.lower() if sep else ''
+
+
+def save_request_stream(filepath):
+    """Stream the raw request body to disk in fixed-size chunks.
+    
+    Writes to a temporary file in the upload folder first and renames it into
+    place, so a partially received upload never replaces an existing file.
+    Returns the SHA-256 hex digest of the body, hashed as it streams.
+    """
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=UPLOAD_DIR, delete=False) as tmp:
+        try:
+            while chunk := request.stream.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+    os.replace(tmp.name, filepath)
+    return digest.hexdigest()
+
+
+def file_sha256(filepath):
+    """Return the SHA-256 hex digest of a file, read in UPLOAD_CHUNK_SIZE chunks."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_multipart_stream(field_name='file'):
+    """Stream one file field of a multipart request body to a temporary file.
+    
+    Parses the body incrementally with streaming-form-data instead of
+    Werkzeug's form parser, so memory use stays at one chunk. Returns
+    (temp_path, filename); filename is None if the field was not sent, in
+    which case the temporary file has already been removed.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR)
+    os.close(fd)
+    target = FileTarget(tmp_path)
+    parser = StreamingFormDataParser(headers={'Content-Type': request.headers['Content-Type']})
+    parser.register(field_name, target)
+    try:
+        while chunk := request.stream.read(UPLOAD_CHUNK_SIZE):
+            parser.data_received(chunk)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    if target.multipart_filename is None:
+        os.unlink(tmp_path)
+    return tmp_path, target.multipart_filename
 
 
-def allowed_file(filename):
-    """Check if file extension is allowed."""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+def _parse_token_expiry(expiry):
+    """Parse a stored token expiry into the naive UTC datetime google-auth uses.
+    
+    Returns None when no expiry is stored; raises ValueError/TypeError if it is malformed.
+    """
+    if not expiry:
+        return None
+    expiry_dt = expiry if isinstance(expiry, datetime) else parse_datetime(expiry)
+    if expiry_dt.tzinfo is not None:
+        expiry_dt = expiry_dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return expiry_dt
 
 
 def get_credentials_from_session():
     """Get credentials from Flask session. Returns Credentials object or None."""
-    from google.oauth2.credentials import Credentials
-    
     if 'token_data' not in session:
-        print("DEBUG: No token_data in session")
+        log.debug("No token_data in session")
         return None
     
     try:
-        creds_dict = session['token_data'].copy()  # Make a copy to avoid mutating session
-        SCOPES = [
-            "openid",
-            "https://www.googleapis.com/auth/calendar.events",
-            "https://www.googleapis.com/auth/calendar",
-            "https://www.googleapis.com/auth/userinfo.email",
-            "https://www.googleapis.com/auth/userinfo.profile"
-        ]
-        
-        # Keep expiry as string - Credentials.from_authorized_user_info expects string format
-        # If it's somehow a datetime object, convert it back to ISO string
-        if 'expiry' in creds_dict:
-            if isinstance(creds_dict['expiry'], datetime):
-                creds_dict['expiry'] = creds_dict['expiry'].isoformat()
-            elif not isinstance(creds_dict['expiry'], str):
-                # Remove invalid expiry
-                print(f"Warning: Invalid expiry type: {type(creds_dict['expiry'])}, removing")
-                creds_dict.pop('expiry', None)
+        token_data = session['token_data']
         
         # Ensure all required fields are present
-        required_fields = ['token', 'token_uri', 'client_id', 'client_secret']
-        for field in required_fields:
-            if field not in creds_dict or not creds_dict[field]:
-                print(f"Warning: Missing required field in session token_data: {field}")
-                return None
+        missing = [field for field in REQUIRED_TOKEN_FIELDS if not token_data.get(field)]
+        if missing:
+            log.warning("Missing required field in session token_data: %s", missing[0])
+            return None
+        
+        try:
+            expiry = _parse_token_expiry(token_data.get('expiry'))
+        except (TypeError, ValueError):
+            log.warning("Invalid expiry in session token_data: %r, ignoring", token_data.get('expiry'))
+            expiry = None
+        if expiry is None:
+            # Like from_authorized_user_info, treat an unknown expiry as already expired
+            expiry = datetime.now(timezone.utc).replace(tzinfo=None) - TOKEN_EXPIRY_MARGIN
         
-        print(f"DEBUG: Creating credentials from session data with token: {creds_dict.get('token', '')[:20]}...")
-        creds = Credentials.from_authorized_user_info(creds_dict, SCOPES)
-        print(f"DEBUG: Credentials created successfully, valid: {creds.valid}, expired: {creds.expired if hasattr(creds, 'expired') else 'N/A'}")
+        # Build Credentials directly instead of copying token_data for from_authorized_user_info
+        creds = Credentials(
+            token=token_data['token'],
+            refresh_token=token_data.get('refresh_token'),
+            token_uri=token_data['token_uri'],
+            client_id=token_data['client_id'],
+            client_secret=token_data['client_secret'],
+            scopes=token_data.get('scopes') or SCOPES,
+            expiry=expiry
+        )
+        log.debug("Credentials created from session, valid: %s, expired: %s", creds.valid, creds.expired)
         return creds
-    except Exception as e:
-        print(f"Error loading credentials from session: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        log.exception("Error loading credentials from session")
         return None
 
 
-def save_credentials_to_session(credentials):
-    """Save credentials to Flask session."""
+def read_text_file(filepath):
+    """Read a UTF-8 text file in one bulk read and decode it in one pass.
+    
+    Invalid bytes become U+FFFD instead of failing the upload, and line
+    endings are normalized to LF to match text-mode reads.
+    """
+    text = Path(filepath).read_bytes().decode('utf-8', errors='replace')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def _upload_dir(upload_id):
+    """Return the directory holding an upload's file and everything derived from it."""
+    return UPLOAD_DIR / upload_id
+
+
+def _upload_source_path(upload_id, file_ext):
+    """Return the path an upload's file is saved to.
+    
+    The name is fixed so a user's file can't overwrite events.json, naming.txt or
+    error.json; the original filename is only kept in the session.
+    """
+    return _upload_dir(upload_id) / f'source.{file_ext}'
+
+
+def _stored_events_path(upload_id):
+    """Return the path of the on-disk events file for an upload ID."""
+    return _upload_dir(upload_id) / 'events.json'
+
+
+def save_stored_events(upload_id, events, cache_key=None):
+    """Store serialized events on disk, keyed by upload ID.
+    
+    Only the upload ID rides in the session cookie, so the event list can grow
+    without hitting the browser's ~4KB cookie limit. The events (with datetime
+    objects) are also kept in a per-process LRU for /create-events. With a
+    cache_key, the results are also saved for re-uploads of the same content.
+    """
+    with open(_stored_events_path(upload_id), 'wb') as f:
+        f.write(orjson.dumps(events))
+    if cache_key:
+        save_upload_cache(cache_key, upload_id, events)
+    with _events_cache_lock:
+        _EVENTS_CACHE[upload_id] = events
+        if len(_EVENTS_CACHE) > EVENTS_CACHE_MAX_ENTRIES:
+            _EVENTS_CACHE.popitem(last=False)
+
+
+def load_stored_events(upload_id):
+    """Load events stored by save_stored_events(). Returns None if none are stored."""
+    if not upload_id:
+        return None
+    try:
+        with open(_stored_events_path(upload_id), 'rb') as f:
+            return orjson.loads(f.read())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return None
+
+
+def load_calendar_events(upload_id):
+    """Load an upload's events for /create-events.
+    
+    Returns the in-memory events (datetime start/end) when this process
+    extracted them, else the stored JSON events (ISO 8601 strings), or None.
+    """
+    with _events_cache_lock:
+        events = _EVENTS_CACHE.get(upload_id)
+        if events is not None:
+            _EVENTS_CACHE.move_to_end(upload_id)
+            return events
+    return load_stored_events(upload_id)
+
+
+def _extracted_text_path(upload_id):
+    """Return the path of the cached extracted-text file for an upload ID."""
+    return _upload_dir(upload_id) / 'naming.txt'
+
+
+def save_extracted_text(upload_id, text):
+    """Cache the start of an upload's text on disk for calendar naming, keyed by upload ID.
+    
+    Only the CALENDAR_NAMING_CHARS that create_calendar() reads are kept.
+    """
+    with open(_extracted_text_path(upload_id), 'w', encoding='utf-8') as f:
+        f.write(text[:CALENDAR_NAMING_CHARS])
+
+
+def load_extracted_text(upload_id):
+    """Load text cached by save_extracted_text(). Returns None if none is cached."""
+    if not upload_id:
+        return None
+    try:
+        with open(_extracted_text_path(upload_id), 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _upload_cache_path(cache_key):
+    """Return the path of the content-addressed extraction cache entry for a cache key."""
+    return UPLOAD_DIR / f"{cache_key}.cache.json"
+
+
+def save_upload_cache(cache_key, upload_id, events):
+    """Cache an upload's events and extracted text under its content-based cache key."""
+    entry = {'events': events, 'text': load_extracted_text(upload_id)}
+    with open(_upload_cache_path(cache_key), 'wb') as f:
+        f.write(orjson.dumps(entry))
+
+
+def load_upload_cache(cache_key):
+    """Load a cache entry saved by save_upload_cache(). Returns None on a miss."""
+    path = _upload_cache_path(cache_key)
+    try:
+        with open(path, 'rb') as f:
+            entry = orjson.loads(f.read())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return None
+    # Touch the entry so cleanup_old_uploads() keeps entries that are still being hit
+    os.utime(path)
+    return entry
+
+
+def _job_error_path(upload_id):
+    """Return the path of the error file written when an upload's background job fails."""
+    return _upload_dir(upload_id) / 'error.json'
+
+
+def delete_stored_events(upload_id):
+    """Remove an upload's directory (the file, stored events, naming text and job error), if any."""
+    if not upload_id:
+        return
+    with _events_cache_lock:
+        _EVENTS_CACHE.pop(upload_id, None)
+    shutil.rmtree(_upload_dir(upload_id), ignore_errors=True)
+
+
+def cleanup_old_uploads():
+    """Delete entries in the upload folder not modified within UPLOAD_MAX_AGE.
+    
+    Called on each upload, but sweeps at most once per UPLOAD_CLEANUP_INTERVAL.
+    """
+    global _last_upload_cleanup
+    now = time.time()
+    if now - _last_upload_cleanup < UPLOAD_CLEANUP_INTERVAL:
+        return
+    _last_upload_cleanup = now
+    
+    removed = 0
+    with os.scandir(UPLOAD_DIR) as entries:
+        for entry in entries:
+            try:
+                if now - entry.stat().st_mtime < UPLOAD_MAX_AGE:
+                    continue
+                if entry.is_dir():
+                    shutil.rmtree(entry.path)
+                else:
+                    os.remove(entry.path)
+                removed += 1
+            except OSError as e:
+                log.warning("Could not remove old upload %s: %s", entry.path, e)
+    if removed:
+        log.info("Removed %d uploads older than %dh", removed, UPLOAD_MAX_AGE // 3600)
+
+
+def extract_pdf_text(filepath):
+    """Extract plain text from a PDF, joining pages with newlines.
+    
+    Uses PyMuPDF when it is installed (much faster than pdfplumber for plain
+    text), falling back to pdfplumber if it is missing or cannot parse the file.
+    """
+    if pymupdf is not None:
+        try:
+            with pymupdf.open(filepath) as doc:
+                # sort=True keeps top-to-bottom, left-to-right reading order
+                return '\n'.join(page.get_text('text', sort=True) for page in doc)
+        except Exception as e:
+            log.warning("PyMuPDF could not parse %s: %s, falling back to pdfplumber", filepath, e)
+    
+    with _load_pdfplumber().open(filepath) as pdf:
+        page_count = len(pdf.pages)
+        if page_count < PDF_PARALLEL_MIN_PAGES or PDF_MAX_WORKERS < 2:
+            # Collect pages and join once instead of repeated string concatenation
+            return '\n'.join(page.extract_text() or '' for page in pdf.pages)
+    
+    # pdfplumber's layout analysis is CPU-bound, so give each process a contiguous page range
+    step = -(-page_count // PDF_MAX_WORKERS)
+    ranges = [(filepath, start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    return '\n'.join(_get_pdf_pool().map(_extract_pdf_pages, ranges))
+
+
+def _extract_pdf_pages(args):
+    """Process-pool task: extract text from pages [start, stop) of a PDF with pdfplumber."""
+    filepath, start, stop = args
+    with _load_pdfplumber().open(filepath) as pdf:
+        return '\n'.join(page.extract_text() or '' for page in pdf.pages[start:stop])
+
+
+def _load_pdfplumber():
+    """Import pdfplumber on first use, so processes that never fall back to it skip its import cost."""
+    global pdfplumber
+    if pdfplumber is None:
+        with _pdfplumber_lock:
+            if pdfplumber is None:
+                import pdfplumber as module
+                pdfplumber = module
+    return pdfplumber
+
+
+def _get_pdf_pool():
+    """Return the process pool for PDF extraction, creating it on first use.
+    
+    Uses the forkserver start method, since forking a threaded server process
+    can deadlock the child. The pool is kept for the life of the process so
+    worker startup is paid once.
+    """
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=PDF_MAX_WORKERS,
+                mp_context=multiprocessing.get_context('forkserver')
+            )
+        return _pdf_pool
+
+
+def get_user_info(credentials):
+    """Fetch Google user info for the given credentials.
+    
+    The userinfo response is cached per access token, so repeated /auth-status
+    polls don't re-hit the API. Services are built per call because they hold
+    a per-thread HTTP connection and must not be shared across threads.
+    """
+    now = time.time()
+    # Key on a short digest so raw access tokens aren't kept around as dict keys
+    cache_key = hashlib.blake2b(credentials.token.encode(), digest_size=8).hexdigest()
+    entry = _AUTH_CACHE.get(cache_key)
+    if entry is None or now - entry['user_ts'] > USER_INFO_TTL:
+        service = build_service('oauth2', 'v2', credentials)
+        user_info = service.userinfo().get().execute()
+        if entry is None and len(_AUTH_CACHE) >= AUTH_CACHE_MAX_ENTRIES:
+            # Evict the oldest token (dicts preserve insertion order)
+            _AUTH_CACHE.pop(next(iter(_AUTH_CACHE)), None)
+        entry = {'user': user_info, 'user_ts': now}
+        _AUTH_CACHE[cache_key] = entry
+    return entry['user']
+
+
+def _refresh_key(credentials):
+    """Identify a user's grant by client ID and a digest of the refresh token."""
+    digest = hashlib.blake2b(credentials.refresh_token.encode(), digest_size=8).hexdigest()
+    return f"{credentials.client_id}:{digest}"
+
+
+def _expires_within(credentials, margin):
+    """Check whether credentials are expired or will expire within margin."""
+    if credentials.expiry is None:
+        return credentials.expired
+    # google-auth stores naive UTC expiry times
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return credentials.expiry - margin <= now
+
+
+def refresh_credentials(credentials, margin=None):
+    """Refresh expired credentials in place, once per user across concurrent requests.
+    
+    Parallel polls from several tabs would each hit Google's token endpoint.
+    Instead they serialize on a per-user lock, and a request that gets the
+    lock after another one refreshed reuses that token (the session cookie of
+    the other request isn't visible here, so the token is kept in-process).
+    With margin, tokens that expire within that window are refreshed early too.
+    """
+    key = _refresh_key(credentials)
+    with _refresh_registry_lock:
+        lock = _REFRESH_LOCKS.get(key)
+        if lock is None:
+            if len(_REFRESH_LOCKS) >= AUTH_CACHE_MAX_ENTRIES:
+                # Evict the oldest user (dicts preserve insertion order)
+                oldest = next(iter(_REFRESH_LOCKS))
+                _REFRESH_LOCKS.pop(oldest, None)
+                _REFRESHED_TOKENS.pop(oldest, None)
+            lock = _REFRESH_LOCKS[key] = threading.Lock()
+    
+    with lock:
+        latest = _REFRESHED_TOKENS.get(key)
+        if latest is not None:
+            credentials.token, credentials.expiry = latest
+        # Re-check under the lock: another request may already have refreshed
+        if credentials.expired or (margin is not None and _expires_within(credentials, margin)):
+            credentials.refresh(AUTH_REQUEST)
+            _REFRESHED_TOKENS[key] = (credentials.token, credentials.expiry)
+
+
+def credentials_to_session_data(credentials):
+    """Convert Credentials into the plain dict stored as session['token_data']."""
     creds_dict = {
         'token': credentials.token,
         'refresh_token': credentials.refresh_token,
@@ -98,10 +581,13 @@ def save_credentials_to_session(credentials):
             creds_dict['expiry'] = credentials.expiry.isoformat()
         else:
             creds_dict['expiry'] = str(credentials.expiry)
-    
-    session['token_data'] = creds_dict
-    # Mark session as modified to ensure it's saved
-    session.modified = True
+    return creds_dict
+
+
+def save_credentials_to_session(credentials):
+    """Save credentials to Flask session."""
+    # Item assignment marks the session modified, so no explicit flag is needed
+    session['token_data'] = credentials_to_session_data(credentials)
 
 
 @app.route('/')
@@ -110,19 +596,64 @@ def index():
     return render_template('index.html')
 
 
+def _session_token_is_fresh(token_data):
+    """Cheaply check that session token data is complete and not close to expiry.
+    
+    Mirrors what Credentials.valid would report, without constructing Credentials.
+    """
+    if not all(token_data.get(field) for field in REQUIRED_TOKEN_FIELDS):
+        return False
+    try:
+        expiry_dt = _parse_token_expiry(token_data.get('expiry'))
+    except (TypeError, ValueError):
+        return False
+    if expiry_dt is None:
+        # get_credentials_from_session treats an unknown expiry as already expired
+        return False
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now < expiry_dt - TOKEN_EXPIRY_MARGIN
+
+
+def _within_refresh_grace(creds):
+    """Check whether expired credentials are recent enough to ride out a failed refresh."""
+    if not creds.expiry:
+        return False
+    # google-auth stores naive UTC expiry times
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now - creds.expiry < REFRESH_GRACE_PERIOD
+
+
+def _auth_status_etag(token_data, user_info):
+    """ETag for an authenticated /auth-status response."""
+    payload = orjson.dumps([token_data.get('token'), user_info], option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha1(payload).hexdigest()
+
+
 @app.route('/auth-status')
 def auth_status():
-    """Check authentication status and return user info."""
+    """Check authentication status and return user info.
+    
+    Authenticated responses carry an ETag keyed on the access token and user info.
+    While the token is fresh, a request with a matching If-None-Match gets a 304
+    without rebuilding credentials or calling Google's APIs.
+    """
     has_token = 'token_data' in session
     user_info = session.get('user_info', None)
     is_authenticated = False
     
-    print(f"Auth status check: has_token={has_token}, session_auth={session.get('authenticated')}")
+    token_data = session.get('token_data')
+    if token_data and user_info and _session_token_is_fresh(token_data):
+        etag = _auth_status_etag(token_data, user_info)
+        if etag in request.if_none_match:
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+    
+    log.debug("Auth status check: has_token=%s, session_auth=%s", has_token, session.get('authenticated'))
     
     if has_token:
         try:
-            from googleapiclient.discovery import build
-            
             creds = get_credentials_from_session()
             if not creds:
                 return jsonify({
@@ -140,49 +671,52 @@ def auth_status():
                 if creds.expired and creds.refresh_token:
                     # Try to refresh
                     try:
-                        from google.auth.transport.requests import Request
-                        creds.refresh(Request())
+                        refresh_credentials(creds)
                         # Save refreshed credentials back to session
                         save_credentials_to_session(creds)
                         is_authenticated = True
                     except Exception as e:
-                        # If refresh fails due to network issues, still consider authenticated
-                        # The token will be refreshed on next API call
+                        # If refresh fails due to network issues shortly after expiry, still
+                        # consider authenticated; the token will be refreshed on next API call.
+                        # Past the grace period a revoked token would otherwise look valid forever.
                         error_str = str(e)
-                        if 'Failed to resolve' in error_str or 'network' in error_str.lower():
-                            print(f"Network issue refreshing token, but will treat as authenticated: {e}")
+                        is_network_error = 'Failed to resolve' in error_str or 'network' in error_str.lower()
+                        if is_network_error and _within_refresh_grace(creds):
+                            log.warning("Network issue refreshing token, but will treat as authenticated: %s", e)
                             is_authenticated = True
                         else:
-                            print(f"Could not refresh token: {e}")
+                            log.warning("Could not refresh token: %s", e)
                             is_authenticated = False
                 else:
                     is_authenticated = not creds.expired
             
-            print(f"Auth check: valid={creds.valid}, expired={creds.expired}, has_token={bool(creds.token)}, is_authenticated={is_authenticated}")
+            log.debug("Auth check: valid=%s, expired=%s, has_token=%s, is_authenticated=%s",
+                      creds.valid, creds.expired, bool(creds.token), is_authenticated)
             
             if is_authenticated:
                 # Try to get user info from Google API (use cached if available)
                 if not user_info:
                     try:
-                        service = build('oauth2', 'v2', credentials=creds)
-                        user_info = service.userinfo().get().execute()
+                        user_info = get_user_info(creds)
                         # Cache user info in session
                         session['user_info'] = user_info
-                        session.modified = True
                     except Exception as e:
-                        print(f"Could not fetch user info (will still show as authenticated): {e}")
+                        log.warning("Could not fetch user info (will still show as authenticated): %s", e)
                         # Authentication is still valid even if we can't get user info
                         pass
-        except Exception as e:
-            print(f"Error loading credentials: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            log.exception("Error loading credentials")
     
-    return jsonify({
+    response = jsonify({
         'authenticated': is_authenticated,
         'has_token': has_token,
         'user': user_info
     })
+    if is_authenticated and user_info and 'token_data' in session:
+        response.set_etag(_auth_status_etag(session['token_data'], user_info))
+    # Always revalidate so sign-in/sign-out changes show up immediately
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 
 @app.route('/signout')
@@ -195,113 +729,225 @@ def signout():
     return redirect(url_for('index'))
 
 
+def serialize_event(event):
+    """Normalize an extracted event into the dict that is stored and sent to the client.
+    
+    start/end stay datetime objects; orjson writes them as ISO 8601 strings.
+    """
+    return {
+        'title': event['title'],
+        'start': event['start'],
+        'end': event['end'],
+        'description': event.get('description', ''),
+        'location': event.get('location', ''),
+        'type': event.get('type', 'event'),
+        'all_day': event.get('all_day', False),
+        'recurring': event.get('recurring', False)
+    }
+
+
+def _stream_events_ndjson(upload_id, events, cache_key=None):
+    """Yield NDJSON lines for /upload: one {"event": ...} line per event, then a summary line.
+    
+    API-only: the web UI uploads with `Prefer: respond-async` and polls instead.
+    
+    The summary line is {"success": true, "count": N}, or {"error": ...} if
+    extraction fails mid-stream. Events are stored on disk once the stream completes.
+    """
+    events_serialized = []
+    try:
+        for event in events:
+            serialized = serialize_event(event)
+            events_serialized.append(serialized)
+            yield orjson.dumps({'event': serialized}) + b'\n'
+        save_stored_events(upload_id, events_serialized, cache_key)
+    except Exception as e:
+        yield orjson.dumps({'error': f'Error parsing events: {str(e)}'}) + b'\n'
+        return
+    yield orjson.dumps({'success': True, 'count': len(events_serialized)}) + b'\n'
+
+
+def extract_upload_events(filepath, filename, file_ext, upload_id):
+    """Extract events from a saved upload, caching its text for calendar naming.
+    
+    Returns an iterable of events (lazy for the dateparser path).
+    """
+    use_gemini = os.environ.get('GEMINI_API_KEY') is not None
+    
+    if file_ext in IMAGE_EXTENSIONS:
+        # Process image file using Gemini Vision (extracts events directly)
+        log.info("Processing image file: %s", filename)
+        events = extract_events_from_image(filepath)
+        log.info("Extracted %d events from image", len(events))
+        
+        # For images, use the first 5 event titles as context for calendar name generation
+        event_titles = ' '.join([event.get('title', '') for event in events[:5]])
+        save_extracted_text(upload_id, event_titles if event_titles else filename)
+        return events
+    
+    # Read text content from text or PDF files
+    if file_ext == 'txt':
+        text = read_text_file(filepath)
+    else:
+        text = extract_pdf_text(filepath)
+    # Cache the naming excerpt so /create-events doesn't re-read or re-parse the file
+    save_extracted_text(upload_id, text)
+    
+    # Extract events from text (the dateparser path yields events lazily)
+    if use_gemini:
+        return extract_events_with_gemini(text)
+    return iter_events_from_text(text)
+
+
+def run_upload_job(filepath, filename, file_ext, upload_id, cache_key=None):
+    """Background job body for async uploads: extract, serialize and store events.
+    
+    The outcome is written to disk (events file, or an error file on failure)
+    so /upload/status can answer from any worker process.
+    """
+    try:
+        events_serialized = [
+            serialize_event(event)
+            for event in extract_upload_events(filepath, filename, file_ext, upload_id)
+        ]
+        save_stored_events(upload_id, events_serialized, cache_key)
+        log.debug("Job %s stored %d events", upload_id, len(events_serialized))
+        return events_serialized
+    except Exception as e:
+        log.error("Upload job %s failed: %s", upload_id, e)
+        with open(_job_error_path(upload_id), 'wb') as f:
+            f.write(orjson.dumps({'error': f'Error parsing events: {str(e)}'}))
+        raise
+
+
+def _prefers_async():
+    """Return True if the client asked for an async response (RFC 7240 `Prefer: respond-async`)."""
+    prefer = request.headers.get('Prefer', '')
+    return any(token.strip().lower() == 'respond-async' for token in prefer.split(','))
+
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    """Handle file upload and parse events for syllabus parsing."""
-    if 'file' not in request.files:
+    """Handle file upload and parse events for syllabus parsing.
+    
+    Accepts either a multipart form with a `file` field, or a raw
+    `application/octet-stream` body with the filename in the `X-Filename` header.
+    Both are streamed straight to disk (multipart via streaming-form-data when
+    it is installed), skipping Werkzeug's multipart parser.
+    
+    With `Prefer: respond-async` (what the web UI sends), extraction runs in a
+    background job and the response is 202 with a `job_id` to poll at
+    /upload/status/<job_id>. Synchronous API clients can instead send
+    `Accept: application/x-ndjson` to have events streamed as they are extracted.
+    Re-uploads of identical content are answered from the extraction cache.
+    """
+    raw_upload = request.mimetype == 'application/octet-stream'
+    multipart_tmp = None
+    if raw_upload:
+        original_filename = unquote(request.headers.get('X-Filename', ''))
+    elif request.mimetype == 'multipart/form-data' and StreamingFormDataParser is not None:
+        multipart_tmp, original_filename = save_multipart_stream()
+        if original_filename is None:
+            return jsonify({'error': 'No file provided'}), 400
+    elif 'file' in request.files:
+        file = request.files['file']
+        original_filename = file.filename
+    else:
         return jsonify({'error': 'No file provided'}), 400
     
+    cleanup_old_uploads()
+    
     # Clear any previously stored content when uploading to the syllabus page
+    previous_job = UPLOAD_JOBS.pop(session.get('upload_id'), None)
+    if previous_job is not None:
+        previous_job.cancel()
+    delete_stored_events(session.get('upload_id'))
     session.pop('events', None)
     session.pop('filename', None)
     
-    # Add a unique upload ID for tracking
-    import uuid
-    upload_id = str(uuid.uuid4())[:8]
+    # Add a unique upload ID for tracking (also keys the on-disk events file)
+    upload_id = uuid.uuid4().hex
     session['upload_id'] = upload_id
-    print(f"DEBUG [UPLOAD]: Created upload ID: {upload_id}")
-    
-    file = request.files['file']
+    log.debug("Created upload ID: %s", upload_id)
     
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
-    
-    if not allowed_file(file.filename):
+    file_ext = get_file_extension(original_filename)
+    if original_filename == '' or file_ext not in ALLOWED_EXTENSIONS:
+        if multipart_tmp is not None:
+            os.unlink(multipart_tmp)
+        if original_filename == '':
+            return jsonify({'error': 'No file selected'}), 400
         return jsonify({'error': 'File type not allowed. Please upload .txt, .pdf, or image files.'}), 400
     
     # Save file
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
-    print(f"File saved: {filename}")
+    filename = secure_filename(original_filename)
+    # Each upload gets its own directory, so same-named files from different users don't collide
+    _upload_dir(upload_id).mkdir()
+    filepath = str(_upload_source_path(upload_id, file_ext))
+    if raw_upload:
+        digest = save_request_stream(filepath)
+    else:
+        if multipart_tmp is not None:
+            os.replace(multipart_tmp, filepath)
+        else:
+            file.save(filepath)
+        digest = file_sha256(filepath)
+    log.debug("File saved: %s (extension: %s)", filename, file_ext)
     
-    # Check if it's an image file
-    image_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp'}
-    file_ext = '.' + filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    use_gemini = os.environ.get('GEMINI_API_KEY') is not None
+    if file_ext in IMAGE_EXTENSIONS and not use_gemini:
+        return jsonify({'error': 'GEMINI_API_KEY is required for image processing'}), 400
     
-    print(f"File extension: {file_ext}")
+    # Identical content parsed the same way gives the same events, so reuse them
+    cache_key = f"{digest}.{'gemini' if use_gemini else 'dateparser'}"
+    cached = load_upload_cache(cache_key)
+    if cached is not None:
+        log.debug("Reusing cached events for %s", cache_key)
+        session['filename'] = filename
+        if cached['text'] is not None:
+            save_extracted_text(upload_id, cached['text'])
+        save_stored_events(upload_id, cached['events'])
+        return jsonify({
+            'success': True,
+            'events': cached['events'],
+            'count': len(cached['events'])
+        })
+    
+    if _prefers_async():
+        session['filename'] = filename
+        job = _upload_executor.submit(run_upload_job, filepath, filename, file_ext, upload_id, cache_key)
+        UPLOAD_JOBS[upload_id] = job
+        # Runs immediately if the job already finished
+        job.add_done_callback(lambda _: UPLOAD_JOBS.pop(upload_id, None))
+        log.debug("Queued extraction job %s", upload_id)
+        return jsonify({
+            'job_id': upload_id,
+            'status_url': url_for('upload_status', job_id=upload_id)
+        }), 202
     
     # Extract events
     try:
-        use_gemini = os.environ.get('GEMINI_API_KEY') is not None
+        events = extract_upload_events(filepath, filename, file_ext, upload_id)
         
-        if file_ext in image_extensions:
-            # Handle image files with Gemini Vision
-            print(f"Processing image file: {filename}")
-            if not use_gemini:
-                return jsonify({'error': 'GEMINI_API_KEY is required for image processing'}), 400
-            
-            # Process image file using Gemini Vision (extracts events directly)
-            events = extract_events_from_image(filepath)
-            print(f"Successfully extracted {len(events)} events from image")
-            
-            # For images, extract text for calendar naming
-            # Use event titles as context for calendar name generation
-            event_titles = ' '.join([event.get('title', '') for event in events[:5]])  # First 5 event titles
-            text = event_titles if event_titles else filename
-        else:
-            # Read text content from text or PDF files
-            try:
-                if filename.endswith('.txt'):
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        text = f.read()
-                elif filename.endswith('.pdf'):
-                    # Extract text from PDF using pdfplumber
-                    import pdfplumber
-                    text = ''
-                    with pdfplumber.open(filepath) as pdf:
-                        for page in pdf.pages:
-                            text += page.extract_text() + '\n'
-                else:
-                    return jsonify({'error': 'Unsupported file type'}), 400
-            except Exception as e:
-                return jsonify({'error': f'Error reading file: {str(e)}'}), 500
-            
-            # Extract events from text
-            if use_gemini:
-                events = extract_events_with_gemini(text)
-            else:
-                events = extract_events_from_text(text)
+        session['filename'] = filename
         
-        print(f"Serializing {len(events)} events...")
+        if request.accept_mimetypes.best == 'application/x-ndjson':
+            # Stream one event per line as they are produced
+            return Response(
+                stream_with_context(_stream_events_ndjson(upload_id, events, cache_key)),
+                mimetype='application/x-ndjson'
+            )
         
-        # Convert datetime objects to ISO strings for JSON serialization
-        events_serialized = []
-        for event in events:
-            events_serialized.append({
-                'title': event['title'],
-                'start': event['start'].isoformat(),
-                'end': event['end'].isoformat(),
-                'description': event.get('description', ''),
-                'location': event.get('location', ''),
-                'type': event.get('type', 'event'),
-                'all_day': event.get('all_day', False),
-                'recurring': event.get('recurring', False)
-            })
+        # Normalize events (one list serves both the stored copy and the response;
+        # orjson renders the datetimes as ISO strings)
+        events_serialized = [serialize_event(event) for event in events]
         
-        print(f"Events serialized, storing in session...")
-        
-        # Store events and filename in session for later use
-        # NOTE: We deliberately do NOT store file_content in session because:
+        # Store events on disk and only the filename/upload ID in session for later use
+        # NOTE: We deliberately do NOT store events or file_content in session because:
         # 1. It causes the session cookie to exceed 4KB (browsers reject it)
-        # 2. The file is already saved to disk and can be re-read
-        session['events'] = events_serialized
-        session['filename'] = filename
+        # 2. The signed cookie would be re-encoded and re-verified on every request
+        save_stored_events(upload_id, events_serialized, cache_key)
         
-        print(f"DEBUG [UPLOAD]: Upload ID: {upload_id}")
-        print(f"DEBUG: Stored filename: {session.get('filename', '')}")
-        
-        print("Response ready to send")
+        log.debug("Stored %d events for upload %s (%s)", len(events_serialized), upload_id, filename)
         
         return jsonify({
             'success': True,
@@ -312,27 +958,64 @@ def upload_file():
         return jsonify({'error': f'Error parsing events: {str(e)}'}), 500
 
 
-@app.route('/oauth')
-def oauth():
-    """Initiate Google OAuth flow."""
-    from google_auth_oauthlib.flow import Flow
-    from googleapiclient.discovery import build
-    
-    # OAuth 2.0 settings
-    SCOPES = [
-        "openid",
-        "https://www.googleapis.com/auth/calendar.events",
-        "https://www.googleapis.com/auth/calendar",
-        "https://www.googleapis.com/auth/userinfo.email",
-        "https://www.googleapis.com/auth/userinfo.profile"
-    ]
+@app.route('/upload/status/<job_id>')
+def upload_status(job_id):
+    """Report the state of a background extraction job started by an async /upload.
     
-    # Create flow instance
-    flow = Flow.from_client_secrets_file(
-        'credentials.json',
+    Returns {"state": "pending"} until the job finishes, then the same payload
+    as a synchronous upload with "state": "done", or "state": "error". A job that
+    left no result and isn't running in this process is reported as an error once
+    its upload directory is gone or older than UPLOAD_JOB_TIMEOUT.
+    """
+    # Jobs are only visible to the session that started them
+    if job_id != session.get('upload_id'):
+        return jsonify({'error': 'Unknown upload job'}), 404
+    
+    events = load_stored_events(job_id)
+    if events is not None:
+        return jsonify({'state': 'done', 'success': True, 'events': events, 'count': len(events)})
+    
+    try:
+        with open(_job_error_path(job_id), 'rb') as f:
+            error = orjson.loads(f.read())
+        return jsonify({'state': 'error', **error}), 500
+    except FileNotFoundError:
+        pass
+    
+    if job_id not in UPLOAD_JOBS:
+        # Not running here; it may be in another worker, unless it has gone quiet or been deleted
+        try:
+            stale = time.time() - _upload_dir(job_id).stat().st_mtime > UPLOAD_JOB_TIMEOUT
+        except FileNotFoundError:
+            stale = True
+        if stale:
+            return jsonify({'state': 'error', 'error': 'Upload job was lost; please upload the file again'}), 500
+    
+    # Still running (possibly in another worker process)
+    return jsonify({'state': 'pending'})
+
+
+@functools.lru_cache(maxsize=1)
+def load_client_config():
+    """Read the OAuth client secrets from credentials.json (once per process)."""
+    with open(CLIENT_SECRETS_FILE, 'rb') as f:
+        return orjson.loads(f.read())
+
+
+def create_oauth_flow():
+    """Create an OAuth flow for the calendar scopes, redirecting back to /oauth/callback."""
+    return Flow.from_client_config(
+        load_client_config(),
         scopes=SCOPES,
         redirect_uri=url_for('oauth_callback', _external=True)
     )
+
+
+@app.route('/oauth')
+def oauth():
+    """Initiate Google OAuth flow."""
+    # Create flow instance
+    flow = create_oauth_flow()
     
     # Get authorization URL - use 'consent' to force refresh token
     authorization_url, state = flow.authorization_url(
@@ -350,29 +1033,13 @@ def oauth():
 @app.route('/oauth/callback')
 def oauth_callback():
     """Handle OAuth callback."""
-    from google_auth_oauthlib.flow import Flow
-    from googleapiclient.discovery import build
-    
-    SCOPES = [
-        "openid",
-        "https://www.googleapis.com/auth/calendar.events",
-        "https://www.googleapis.com/auth/calendar",
-        "https://www.googleapis.com/auth/userinfo.email",
-        "https://www.googleapis.com/auth/userinfo.profile"
-    ]
-    
     # Recreate flow
-    flow = Flow.from_client_secrets_file(
-        'credentials.json',
-        scopes=SCOPES,
-        redirect_uri=url_for('oauth_callback', _external=True)
-    )
+    flow = create_oauth_flow()
     
     # Fetch token
     authorization_response = request.url
     
     # Suppress warnings about scope changes (Google adds 'openid' automatically)
-    import warnings
     try:
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
@@ -407,30 +1074,78 @@ def oauth_callback():
         if existing_creds and existing_creds.refresh_token:
             credentials.refresh_token = existing_creds.refresh_token
     
+    # Collect the new session state and apply it in one update
+    new_session = {
+        'token_data': credentials_to_session_data(credentials),
+        'authenticated': True
+    }
+    
     # Get user info from Google API
     try:
-        service = build('oauth2', 'v2', credentials=credentials)
-        user_info = service.userinfo().get().execute()
-        session['user_info'] = user_info
-        print(f"Retrieved user info: {user_info.get('email', 'Unknown')}")
+        user_info = get_user_info(credentials)
+        new_session['user_info'] = user_info
+        log.debug("Retrieved user info for %s", user_info.get('email', 'Unknown'))
     except Exception as e:
-        print(f"Could not fetch user info: {e}")
+        log.warning("Could not fetch user info: %s", e)
         # Continue anyway - authentication is still valid
     
-    # Save credentials to session
-    save_credentials_to_session(credentials)
-    
-    session['authenticated'] = True
-    session.modified = True  # Ensure session is saved
-    print(f"OAuth callback completed. Session authenticated: {session.get('authenticated')}")
-    print(f"Session has token_data: {'token_data' in session}")
+    session.update(new_session)
+    log.debug("OAuth callback completed. Session authenticated: %s, has token_data: %s",
+              session.get('authenticated'), 'token_data' in session)
     return redirect(url_for('index'))
 
 
+def _prepare_event_for_calendar(event_data):
+    """Convert a stored event into a dict ready for Google Calendar.
+    
+    Accepts either in-memory events (datetime start/end) or stored JSON events
+    (ISO 8601 strings). Returns a new dict with datetime start/end, or None if
+    the event is invalid. The stored copy is never mutated.
+    """
+    try:
+        # Create a copy of the event to avoid modifying stored data
+        event = event_data.copy()
+        
+        # Stored JSON events carry ISO strings; in-memory ones are already datetimes
+        start_dt = event['start']
+        end_dt = event['end']
+        if isinstance(start_dt, str):
+            start_dt = parse_datetime(start_dt)
+        if isinstance(end_dt, str):
+            end_dt = parse_datetime(end_dt)
+    except Exception as e:
+        log.warning("Skipping event '%s': %s", event_data.get('title', 'Unknown'), e)
+        return None
+    
+    # Get event type
+    event_type = event_data.get('type', 'event')
+    is_all_day = event_data.get('all_day', False) or event_type == 'task'
+    
+    # Check for valid time range (allow start == end for all-day tasks)
+    if not is_all_day and start_dt >= end_dt:
+        log.warning("Skipping event '%s': Start time (%s) is not before end time (%s)", event['title'], start_dt, end_dt)
+        return None
+    
+    # For all-day tasks, ensure end_dt is at least start_dt (can be equal)
+    if is_all_day and end_dt < start_dt:
+        log.debug("Adjusting end time for all-day task '%s' from %s to %s", event['title'], end_dt, start_dt)
+        end_dt = start_dt
+    
+    event['start'] = start_dt
+    event['end'] = end_dt
+    
+    # Preserve all_day flag
+    event['all_day'] = event_data.get('all_day', False)
+
+    event['recurring'] = event_data.get('recurring', False)
+    return event
+
+
 @app.route('/create-events', methods=['POST'])
 def create_events():
     """Create events in Google Calendar."""
-    if 'events' not in session:
+    events = load_calendar_events(session.get('upload_id'))
+    if events is None:
         return jsonify({'error': 'No events found. Please upload and parse a file first.'}), 400
     
     # Check if authenticated by checking for token in session
@@ -451,47 +1166,48 @@ def create_events():
         # Get the actual stored filename from session (this is the secure filename saved to disk)
         filename = session.get('filename', '')
         
+        # Filter events based on user selection
+        if event_indices:
+            events_to_create = [events[i] for i in event_indices if 0 <= i < len(events)]
+            log.info("Creating %d selected events out of %d total", len(events_to_create), len(events))
+        else:
+            events_to_create = events
+            log.info("No selection made, creating all %d events", len(events))
+        
+        # Validate and convert every event before any network I/O, dropping invalid ones
+        prepared_events = [
+            event for event in map(_prepare_event_for_calendar, events_to_create)
+            if event is not None
+        ]
+        
+        session_token = creds.token
+        # Refresh ahead of time if the token could expire partway through the import
+        if creds.refresh_token and _expires_within(creds, IMPORT_REFRESH_MARGIN):
+            try:
+                refresh_credentials(creds, margin=IMPORT_REFRESH_MARGIN)
+            except Exception as e:
+                if creds.expired:
+                    raise
+                log.warning("Early token refresh failed, continuing with the current token: %s", e)
+        
         # Create service - this may refresh the credentials if expired
         service = create_google_service_from_credentials(creds)
-        # Save credentials back to session in case they were refreshed
-        save_credentials_to_session(creds)
-        events = session['events']
+        # Only rewrite the session cookie if the credentials were actually refreshed
+        if creds.token != session_token:
+            save_credentials_to_session(creds)
         
         # Debug: Print filenames
-        print(f"DEBUG [CREATE-EVENTS]: Request filename: {repr(request_filename)}")
-        print(f"DEBUG [CREATE-EVENTS]: Stored filename: {repr(filename)}")
+        log.debug("Request filename: %r, stored filename: %r", request_filename, filename)
         
-        # Re-read the file content from disk to ensure we get the correct file
-        # This guarantees we're always using the most recently uploaded file
-        file_content = ''
-        if filename:
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            if os.path.exists(filepath):
-                try:
-                    if filename.endswith('.txt'):
-                        with open(filepath, 'r', encoding='utf-8') as f:
-                            file_content = f.read()
-                    elif filename.endswith('.pdf'):
-                        import pdfplumber
-                        with pdfplumber.open(filepath) as pdf:
-                            for page in pdf.pages:
-                                file_content += page.extract_text() + '\n'
-                except Exception as e:
-                    print(f"ERROR reading file for calendar naming: {e}")
-            else:
-                print(f"WARNING: File '{filename}' not found on disk! Filepath: {filepath}")
-                print(f"This usually means old session data. We'll use default calendar name.")
+        # Every upload saves its naming excerpt, so the uploaded file is never re-read here
+        file_content = load_extracted_text(session.get('upload_id')) or ''
         
-        print(f"DEBUG [CREATE-EVENTS]: Upload ID: {session.get('upload_id', 'none')}")
-        print(f"DEBUG: filename: {filename}")
-        print(f"DEBUG: file_content length: {len(file_content)}")
-        print(f"DEBUG: file_content preview: {file_content[:200] if file_content else 'None'}...")
+        log.debug("Upload ID: %s, filename: %s, file_content length: %d",
+                  session.get('upload_id', 'none'), filename, len(file_content))
         
         # Check if file_content is actually being passed
         if not file_content or file_content.strip() == '':
-            print(f"ERROR: file_content is empty! This means Gemini won't be able to generate a proper calendar name.")
-            print(f"Filename: {filename}")
-            print(f"Filepath: {filepath if filename else 'None'}")
+            log.warning("file_content is empty for '%s'; Gemini can't generate a proper calendar name", filename)
         
         # Create a new calendar (always creates a new one)
         syllabus_calendar_id, calendar_name = create_calendar(service, file_content, filename)
@@ -499,60 +1215,15 @@ def create_events():
         # Get calendar link
         calendar_link = f"https://calendar.google.com/calendar/render?cid={syllabus_calendar_id}"
         
-        # Filter events based on user selection
-        if event_indices:
-            events_to_create = [events[i] for i in event_indices if 0 <= i < len(events)]
-            print(f"Creating {len(events_to_create)} selected events out of {len(events)} total")
-        else:
-            events_to_create = events
-            print(f"No selection made, creating all {len(events)} events")
-        
-        created_events = []
-        
-        for event_data in events_to_create:
-            try:
-                # Create a copy of the event to avoid modifying session data
-                event = event_data.copy()
-                
-                # Convert ISO strings back to datetime objects
-                start_dt = datetime.fromisoformat(event['start'])
-                end_dt = datetime.fromisoformat(event['end'])
-                
-                # Validate datetime objects
-                if not start_dt or not end_dt:
-                    print(f"Skipping event '{event['title']}': Invalid datetime values")
-                    continue
-                
-                # Get event type
-                event_type = event_data.get('type', 'event')
-                is_all_day = event_data.get('all_day', False) or event_type == 'task'
-                
-                # Check for valid time range (allow start == end for all-day tasks)
-                if not is_all_day and start_dt >= end_dt:
-                    print(f"Skipping event '{event['title']}': Start time ({start_dt}) is not before end time ({end_dt})")
-                    continue
-                
-                # For all-day tasks, ensure end_dt is at least start_dt (can be equal)
-                if is_all_day and end_dt < start_dt:
-                    print(f"Adjusting end time for all-day task '{event['title']}' from {end_dt} to {start_dt}")
-                    end_dt = start_dt
-                
-                event['start'] = start_dt
-                event['end'] = end_dt
-                
-                # Preserve all_day flag
-                event['all_day'] = event_data.get('all_day', False)
-
-                event['recurring'] = event_data.get('recurring', False)
-                
-                result = create_google_event(service, event, calendar_id=syllabus_calendar_id, timezone=user_timezone)
-                created_events.append({
-                    'title': event['title'],
-                    'link': result.get('htmlLink')
-                })
-            except Exception as e:
-                print(f"Error creating event '{event_data.get('title', 'Unknown')}': {e}")
-                continue
+        # Insert in batches so N events cost ceil(N / 50) HTTP round-trips instead of N
+        results = create_google_events_batch(
+            service, prepared_events, calendar_id=syllabus_calendar_id, timezone=user_timezone, credentials=creds
+        )
+        created_events = [
+            {'title': event['title'], 'link': result.get('htmlLink')}
+            for event, result in zip(prepared_events, results)
+            if result is not None
+        ]
         
         return jsonify({
             'success': True,
@@ -562,12 +1233,11 @@ def create_events():
             'calendar_link': calendar_link
         })
     except Exception as e:
-        import traceback
-        print(f"Error creating events: {e}")
-        print(traceback.format_exc())
+        log.exception("Error creating events")
         return jsonify({'error': f'Error creating events: {str(e)}'}), 500
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Debugger and reloader are opt-in via FLASK_DEBUG=1; production runs under gunicorn
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000, threaded=True)
 
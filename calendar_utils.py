@@ -5,20 +5,37 @@ Google Calendar uses OAuth2. Place your OAuth client credentials in `credentials
 
 ICS export uses the `icalendar` package and creates a simple calendar file.
 """
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional
+import functools
+import json
+import logging
 import os
-from datetime import datetime
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 
 try:
+    import httplib2
+    import requests
+    from requests.adapters import HTTPAdapter
+    from google_auth_httplib2 import AuthorizedHttp
     from google.auth.transport.requests import Request
     from google.oauth2.credentials import Credentials
     from google_auth_oauthlib.flow import InstalledAppFlow
-    from googleapiclient.discovery import build
+    from googleapiclient import discovery_cache
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.errors import HttpError
 except Exception:
     # Defer import errors until runtime; requirements not installed during static analysis.
     Credentials = None
 
-from icalendar import Calendar, Event
+from parsers import get_generative_model
+
+log = logging.getLogger(__name__)
 
 # If modifying these scopes, delete the file token.json.
 SCOPES = [
@@ -29,6 +46,142 @@ SCOPES = [
     "https://www.googleapis.com/auth/userinfo.profile"
 ]
 
+# Characters of syllabus text sent to Gemini when naming a calendar (about one page).
+CALENDAR_NAMING_CHARS = 1300
+# Models tried in order when naming a calendar; later ones only if an earlier one fails.
+CALENDAR_NAME_MODELS = ("gemini-2.5-flash", "gemini-2.5-pro", "gemini-2.0-flash")
+# Constrain the naming answer to JSON so it needs no cleanup.
+CALENDAR_NAME_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "object",
+        "properties": {"course_code": {"type": "string"}},
+        "required": ["course_code"],
+    },
+}
+# Suggested names too generic to use as a calendar name.
+GENERIC_CALENDAR_NAMES = frozenset({"syllabus", "course", "class", "schedule"})
+
+# Google Calendar accepts at most 50 calls in a single batch request.
+BATCH_SIZE = 50
+# Concurrent inserts used when a batch request is rejected; kept low to respect per-user quotas.
+INSERT_MAX_WORKERS = 10
+# Built services each thread keeps for reuse, keyed by access token.
+SERVICE_CACHE_SIZE = 8
+# Rounds of re-queuing rate-limited inserts before giving up on them.
+BATCH_MAX_RETRIES = 5
+# 403 error reasons that mean "slow down" rather than "forbidden".
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+# Upper bound in seconds on a single retry wait, including server-provided Retry-After values.
+RETRY_MAX_DELAY = 60
+
+
+# Google Calendar BYDAY codes, indexed by datetime.weekday().
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+# Single-letter day codes used in compact schedules like "MWF".
+DAY_LETTERS = {"M": "MO", "T": "TU", "W": "WE", "R": "TH", "F": "FR"}
+# Day names and abbreviations recognized in event descriptions.
+DAY_NAMES = {
+    "MON": "MO", "MONDAY": "MO",
+    "TUE": "TU", "TUES": "TU", "TUESDAY": "TU",
+    "WED": "WE", "WEDNESDAY": "WE",
+    "THUR": "TH", "THURS": "TH", "THURSDAY": "TH",
+    "FRI": "FR", "FRIDAY": "FR",
+    "SAT": "SA", "SATURDAY": "SA",
+    "SUN": "SU", "SUNDAY": "SU",
+}
+# Whole-word day names (optionally plural, e.g. "Mondays"); longest names first.
+_DAY_NAME_RE = re.compile(r"\b(" + "|".join(sorted(DAY_NAMES, key=len, reverse=True)) + r")S?\b")
+
+
+# Credentials loaded from token files, keyed by path: (mtime_ns, Credentials)
+_CREDS_CACHE = {}
+
+def _build_auth_request():
+    """Build a token-refresh transport backed by one pooled requests.Session.
+
+    Request() with no session opens a new Session (and TLS connection) for every
+    refresh; sharing one keeps connections to oauth2.googleapis.com alive.
+    """
+    http_session = requests.Session()
+    http_session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+    return Request(session=http_session)
+
+
+# Shared transport for Credentials.refresh(); None if the Google libraries are missing
+AUTH_REQUEST = _build_auth_request() if Credentials is not None else None
+
+# httplib2.Http is not thread-safe, so each thread keeps its own connection pool
+_thread_local = threading.local()
+
+
+def _get_thread_http():
+    """Return this thread's shared httplib2.Http, creating it on first use.
+
+    Reusing one Http per thread keeps TLS connections to googleapis.com alive
+    across requests instead of paying a new handshake for every service.
+    """
+    http = getattr(_thread_local, "http", None)
+    if http is None:
+        http = httplib2.Http()
+        _thread_local.http = http
+    return http
+
+
+@functools.lru_cache(maxsize=None)
+def _get_discovery_doc(service_name: str, version: str) -> str:
+    """Return the discovery document bundled with googleapiclient, read from disk once per process."""
+    doc = discovery_cache.get_static_doc(service_name, version)
+    if doc is None:
+        raise ValueError(f"No bundled discovery document for {service_name} {version}")
+    return doc
+
+
+def _get_thread_discovery_doc(service_name: str, version: str) -> Dict:
+    """Return this thread's parsed copy of a bundled discovery document.
+
+    build_from_document() fills in method descriptions in place as resources are
+    used, so each thread parses its own copy once instead of sharing one dict.
+    """
+    docs = getattr(_thread_local, "discovery_docs", None)
+    if docs is None:
+        docs = _thread_local.discovery_docs = {}
+    doc = docs.get((service_name, version))
+    if doc is None:
+        doc = docs[(service_name, version)] = json.loads(_get_discovery_doc(service_name, version))
+    return doc
+
+
+def build_service(service_name: str, version: str, credentials):
+    """Build a Google API service from the discovery document bundled with googleapiclient.
+
+    The bundled document is kept parsed in memory, so building a service needs no
+    network fetch (unlike build() without static_discovery), no disk read and no
+    JSON parsing. Requests go through this thread's persistent HTTP connection.
+    Services are reused per thread for the same access token, since each build
+    otherwise regenerates its resource methods. A refreshed token gets a new service.
+    The returned service must only be used from the calling thread.
+    """
+    if Credentials is None:
+        raise RuntimeError("Google API libraries are not installed. See requirements.txt")
+
+    services = getattr(_thread_local, "services", None)
+    if services is None:
+        services = _thread_local.services = OrderedDict()
+    key = (service_name, version, credentials.token)
+    service = services.get(key) if credentials.token else None
+    if service is not None:
+        services.move_to_end(key)
+        return service
+
+    http = AuthorizedHttp(credentials, http=_get_thread_http())
+    service = build_from_document(_get_thread_discovery_doc(service_name, version), http=http)
+    if credentials.token:
+        services[key] = service
+        if len(services) > SERVICE_CACHE_SIZE:
+            services.popitem(last=False)
+    return service
+
 
 def create_google_service_from_credentials(credentials):
     """Create a Google Calendar API service from a credentials object.
@@ -48,18 +201,38 @@ def create_google_service_from_credentials(credentials):
     # If credentials are expired, try to refresh
     if credentials.expired and credentials.refresh_token:
         try:
-            credentials.refresh(Request())
+            credentials.refresh(AUTH_REQUEST)
         except Exception as e:
-            print(f"Could not refresh token: {e}")
+            log.warning("Could not refresh token: %s", e)
             raise Exception("Authentication expired. Please sign in again.")
     
     if not credentials.valid:
         raise Exception("Not authenticated. Please sign in with Google first.")
     
-    service = build("calendar", "v3", credentials=credentials)
+    service = build_service("calendar", "v3", credentials)
     return service
 
 
+def load_cached_credentials(token_path: str = "token.json"):
+    """Load Credentials from a token file, reusing the parsed object until the file changes.
+
+    Returns None if the token file does not exist.
+    """
+    try:
+        mtime_ns = os.stat(token_path).st_mtime_ns
+    except FileNotFoundError:
+        _CREDS_CACHE.pop(token_path, None)
+        return None
+
+    cached = _CREDS_CACHE.get(token_path)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+
+    creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+    _CREDS_CACHE[token_path] = (mtime_ns, creds)
+    return creds
+
+
 def create_google_service(credentials_path: str = "credentials.json", token_path: str = "token.json"):
     """Create a Google Calendar API service. Returns the service object.
 
@@ -71,60 +244,37 @@ def create_google_service(credentials_path: str = "credentials.json", token_path
     if Credentials is None:
         raise RuntimeError("Google API libraries are not installed. See requirements.txt")
 
-    creds = None
-    if os.path.exists(token_path):
-        creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+    creds = load_cached_credentials(token_path)
     
     # If there are no (valid) credentials, let the user log in.
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
             # Refresh the token
             try:
-                creds.refresh(Request())
+                creds.refresh(AUTH_REQUEST)
             except Exception as e:
-                print(f"Could not refresh token: {e}")
+                log.warning("Could not refresh token: %s", e)
                 # If refresh fails, raise an error - user needs to re-authenticate
                 raise Exception("Authentication expired. Please sign in again.")
         else:
             # No valid credentials - user needs to authenticate via web OAuth
             raise Exception("Not authenticated. Please sign in with Google first.")
 
-    service = build("calendar", "v3", credentials=creds)
+    service = build_service("calendar", "v3", creds)
     return service
 
 
-def create_calendar(service, file_content=None, filename=None) -> tuple:
-    """Create a new calendar for syllabus events. ALWAYS creates a new calendar.
-    
-    service: Google Calendar API service object
-    file_content: the actual text content of the uploaded file (optional)
-    filename: name of the uploaded file (optional)
-    Returns a tuple of (calendar_id, calendar_name).
+@functools.lru_cache(maxsize=256)
+def suggest_calendar_name(content_snippet: str) -> Optional[str]:
+    """Ask Gemini for a short course name (e.g. "CS 61A") for a syllabus excerpt.
+
+    Results are memoized per excerpt, so re-uploads of the same syllabus skip the call.
+    The next model is only tried if the previous one raised. Returns None if the
+    answer is not a usable name; raises if every model failed.
     """
-    calendar_name = "Syllabus Events"
+    log.debug("Sending %d chars to Gemini for calendar naming", len(content_snippet))
     
-    # Log which file we're using
-    print(f"DEBUG [CALENDAR UTILS]: Creating calendar with filename: {filename}")
-    print(f"DEBUG [CALENDAR UTILS]: file_content length: {len(file_content) if file_content else 0}")
-    
-    # Generate dynamic calendar name using file content
-    if file_content and len(file_content.strip()) > 0:
-        try:
-            import google.generativeai as genai
-            import os
-            
-            api_key = os.environ.get('GEMINI_API_KEY')
-            if api_key:
-                genai.configure(api_key=api_key)
-                
-                # Use first 1300 characters of file content (typically first page)
-                content_snippet = file_content[:1300]
-                
-                print(f"DEBUG [CALENDAR UTILS]: Sending content snippet to Gemini for calendar naming:")
-                print(f"DEBUG [CALENDAR UTILS]: Content snippet (first 500 chars): {content_snippet[:500]}")
-                print(f"DEBUG [CALENDAR UTILS]: Content snippet length: {len(content_snippet)}")
-                
-                prompt = f"""Extract the course code and number from this syllabus. This is VERY IMPORTANT.
+    prompt = f"""Extract the course code and number from this syllabus. This is VERY IMPORTANT.
 
 PRIORITY 1 (HIGHEST PRIORITY): Look for course codes with format [Department][Number]
 Examples: "CS 61A", "CS 101", "Math 55", "MATH 1B", "ENG 125", "EECS 16A", "CHEM 1C"
@@ -142,23 +292,49 @@ READ THE SYLLABUS CONTENT BELOW CAREFULLY and extract the specific course inform
 Syllabus content:
 {content_snippet}
 
-Return ONLY the course code or title from the content above (max 30 characters), nothing else:"""
-                for model_name in ["gemini-2.5-flash", "gemini-2.5-pro", "gemini-2.0-flash"]:
-                    try:
-                        model = genai.GenerativeModel(model_name)
-                        response = model.generate_content(prompt)
-                        suggested_name = response.text.strip().replace('"', '').replace("'", "")
-                        
-                        # Validate the name (remove any extra text, limit length)
-                        if suggested_name and len(suggested_name) <= 30 and suggested_name.lower() not in ["syllabus", "course", "class", "schedule"]:
-                            calendar_name = suggested_name
-                            print(f"Generated calendar name: {calendar_name}")
-                            break
-                    except Exception as e:
-                        print(f"Model {model_name} failed: {e}, trying next model")
-                        continue
+Return JSON whose "course_code" is ONLY the course code or title from the content above (max 30 characters):"""
+    last_error = None
+    for model_name in CALENDAR_NAME_MODELS:
+        try:
+            model = get_generative_model(model_name, CALENDAR_NAME_CONFIG)
+            response = model.generate_content(prompt)
+            suggested_name = str(json.loads(response.text).get("course_code") or "").strip()
         except Exception as e:
-            print(f"Gemini API not available for naming: {e}, using default")
+            log.warning("Model %s failed: %s, trying next model", model_name, e)
+            last_error = e
+            continue
+        
+        # Validate the name (limit length, reject generic words)
+        if suggested_name and len(suggested_name) <= 30 and suggested_name.lower() not in GENERIC_CALENDAR_NAMES:
+            return suggested_name
+        return None
+    raise RuntimeError(f"All Gemini models failed to name the calendar: {last_error}")
+
+
+def create_calendar(service, file_content=None, filename=None) -> tuple:
+    """Create a new calendar for syllabus events. ALWAYS creates a new calendar.
+    
+    service: Google Calendar API service object
+    file_content: the actual text content of the uploaded file (optional)
+    filename: name of the uploaded file (optional)
+    Returns a tuple of (calendar_id, calendar_name).
+    """
+    calendar_name = "Syllabus Events"
+    
+    # Log which file we're using
+    log.debug("Creating calendar for %s (%d chars of content)", filename, len(file_content) if file_content else 0)
+    
+    # Generate dynamic calendar name using file content
+    if file_content and len(file_content.strip()) > 0 and os.environ.get('GEMINI_API_KEY'):
+        # Use the start of the file content (typically first page)
+        content_snippet = file_content[:CALENDAR_NAMING_CHARS]
+        try:
+            suggested_name = suggest_calendar_name(content_snippet)
+            if suggested_name:
+                calendar_name = suggested_name
+                log.info("Generated calendar name: %s", calendar_name)
+        except Exception as e:
+            log.warning("Gemini API not available for naming: %s, using default", e)
     
     # Always create a new calendar
     description = 'Events extracted from academic syllabi'
@@ -168,19 +344,19 @@ Return ONLY the course code or title from the content above (max 30 characters),
         'timeZone': 'America/Los_Angeles'
     }
     
-    created_calendar = service.calendars().insert(body=calendar_body).execute()
+    created_calendar = execute_with_retry(service.calendars().insert(body=calendar_body))
     calendar_id = created_calendar['id']
-    print(f"Created new calendar: {calendar_id} with name: {calendar_name}")
+    log.info("Created new calendar: %s with name: %s", calendar_id, calendar_name)
     
     return calendar_id, calendar_name
 
 
-def create_google_event(service, event: Dict, calendar_id: str = "primary", timezone: str = "America/Los_Angeles") -> Dict:
-    """Create an event in Google Calendar.
+def build_event_body(event: Dict, timezone: str = "America/Los_Angeles") -> Dict:
+    """Build the Google Calendar API request body for an event.
 
     event: dict with keys title, start (datetime), end (datetime), description, location, all_day (bool), recurring (bool)
     timezone: IANA timezone string (default: America/Los_Angeles)
-    Returns the created event resource.
+    Returns the event resource body for events().insert().
     """
     # Validate required fields
     if not event.get("title"):
@@ -199,102 +375,47 @@ def create_google_event(service, event: Dict, calendar_id: str = "primary", time
     # Handle all-day events vs timed events
     if is_all_day:
         # For all-day events, use date field (no time component)
-        # Ensure we have valid dates
-        if not hasattr(start_dt, 'strftime') or not hasattr(end_dt, 'strftime'):
+        if not isinstance(start_dt, date) or not isinstance(end_dt, date):
             raise ValueError("Invalid datetime objects for all-day event")
-            
-        body = {
-            "summary": event.get("title"),
-            "description": event.get("description"),
-            "location": event.get("location"),
-            "start": {
-                "date": start_dt.strftime("%Y-%m-%d")
-            },
-            "end": {
-                "date": end_dt.strftime("%Y-%m-%d")
-            },
-        }
+        start = {"date": start_dt.isoformat()[:10]}
+        end = {"date": end_dt.isoformat()[:10]}
     else:
         # For timed events, use dateTime with timezone
-        # Validate datetime objects
-        if not hasattr(start_dt, 'strftime') or not hasattr(end_dt, 'strftime'):
+        if not isinstance(start_dt, datetime) or not isinstance(end_dt, datetime):
             raise ValueError("Invalid datetime objects for timed event")
         
-        # Format datetime without timezone if naive
-        if start_dt.tzinfo is None:
-            start_str = start_dt.strftime("%Y-%m-%dT%H:%M:%S")
-        else:
-            start_str = start_dt.isoformat()
-            
-        if end_dt.tzinfo is None:
-            end_str = end_dt.strftime("%Y-%m-%dT%H:%M:%S")
-        else:
-            end_str = end_dt.isoformat()
-        
         # Validate that start is before end
         if start_dt >= end_dt:
             raise ValueError(f"Start time ({start_dt}) must be before end time ({end_dt})")
         
-        body = {
-            "summary": event.get("title"),
-            "description": event.get("description"),
-            "location": event.get("location"),
-            "start": {
-                "dateTime": start_str,
-                "timeZone": timezone
-            },
-            "end": {
-                "dateTime": end_str,
-                "timeZone": timezone
-            },
-        }
+        # Naive times are wall-clock times in `timezone`; aware ones keep their offset
+        start = {"dateTime": start_dt.isoformat(timespec="seconds"), "timeZone": timezone}
+        end = {"dateTime": end_dt.isoformat(timespec="seconds"), "timeZone": timezone}
+    
+    body = {
+        "summary": event.get("title"),
+        "description": event.get("description"),
+        "location": event.get("location"),
+        "start": start,
+        "end": end,
+    }
     
     # Add recurrence rule if this is a recurring event (events or tasks)
     if is_recurring:
-        from datetime import timedelta
         
-        # Try to get the days of week from the event description or location
+        # Try to get the days of week from the event description
         # Common patterns: "MWF" (Monday, Wednesday, Friday), "TTH" (Tuesday, Thursday), etc.
-        days_str = event.get("description", "").upper()
-        
-        # Map day abbreviations to Google Calendar format
-        day_patterns = {
-            'M': 'MO', 'MON': 'MO', 'MONDAY': 'MO',
-            'T': 'TU', 'TUE': 'TU', 'TUES': 'TU', 'TUESDAY': 'TU',
-            'W': 'WE', 'WED': 'WE', 'WEDNESDAY': 'WE',
-            'R': 'TH', 'TH': 'TH', 'THUR': 'TH', 'THURS': 'TH', 'THURSDAY': 'TH',
-            'F': 'FR', 'FRI': 'FR', 'FRIDAY': 'FR',
-            'SA': 'SA', 'SAT': 'SA', 'SATURDAY': 'SA',
-            'SU': 'SU', 'SUN': 'SU', 'SUNDAY': 'SU'
-        }
+        days_str = (event.get("description") or "").upper()
         
-        # Try to find day patterns in the description
-        # Look for patterns like "MWF", "TTH", "M W F", "Mon Wed Fri", etc.
-        found_days = []
-        
-        # First, check for abbreviated patterns like "MWF", "TTH"
-        if len(days_str) <= 5 and all(c in 'MTWRF' for c in days_str):
-            # Pattern like "MWF" or "TTH"
-            for char in days_str:
-                if char in day_patterns:
-                    day_code = day_patterns[char]
-                    if day_code not in found_days:
-                        found_days.append(day_code)
-        
-        # Check for word patterns in description
-        if not found_days:
-            import re
-            # Look for day names in the description
-            for pattern, day_code in day_patterns.items():
-                if len(pattern) > 2 and pattern in days_str:
-                    if day_code not in found_days:
-                        found_days.append(day_code)
+        # First, check for abbreviated patterns like "MWF"
+        if len(days_str) <= 5 and all(c in DAY_LETTERS for c in days_str):
+            found = {DAY_LETTERS[c] for c in days_str}
+        else:
+            # Otherwise look for day names like "Mon Wed Fri" or "Tuesdays" in one scan
+            found = {DAY_NAMES[name] for name in _DAY_NAME_RE.findall(days_str)}
         
-        # Fallback: use the start date's day if no pattern found
-        if not found_days:
-            weekday = start_dt.weekday()
-            days_map = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
-            found_days = [days_map[weekday]]
+        # Keep weekday order; fall back to the start date's day if no pattern found
+        found_days = [day for day in WEEKDAYS if day in found] or [WEEKDAYS[start_dt.weekday()]]
         
         # Create recurrence rule with BYDAY parameter
         byday_str = ','.join(found_days)
@@ -312,32 +433,189 @@ def create_google_event(service, event: Dict, calendar_id: str = "primary", time
                 f"RRULE:FREQ=WEEKLY;BYDAY={byday_str};UNTIL={until_datetime}"
             ]
     
-    created = service.events().insert(calendarId=calendar_id, body=body).execute()
+    return body
+
+
+def create_google_event(service, event: Dict, calendar_id: str = "primary", timezone: str = "America/Los_Angeles") -> Dict:
+    """Create an event in Google Calendar.
+
+    event: dict with keys title, start (datetime), end (datetime), description, location, all_day (bool), recurring (bool)
+    timezone: IANA timezone string (default: America/Los_Angeles)
+    Returns the created event resource.
+    """
+    body = build_event_body(event, timezone)
+    created = execute_with_retry(service.events().insert(calendarId=calendar_id, body=body))
     return created
 
 
-def export_events_to_ics(events: List[Dict], path: str = "events.ics") -> str:
+def create_google_events_concurrently(credentials, events: List[Dict], calendar_id: str = "primary", timezone: str = "America/Los_Angeles", max_workers: int = INSERT_MAX_WORKERS) -> List[Optional[Dict]]:
+    """Create events with individual inserts issued from a thread pool.
+
+    Used as a fallback when a batch request is rejected. Inserts are I/O-bound, so
+    running up to `max_workers` at once recovers most of the batching speedup.
+    googleapiclient services are not thread-safe, so each insert builds its own service.
+    Returns a list parallel to `events`: the created event resource, or None if that insert failed.
+    """
+    def _insert(event):
+        try:
+            service = build_service("calendar", "v3", credentials)
+            return create_google_event(service, event, calendar_id=calendar_id, timezone=timezone)
+        except Exception as e:
+            log.error("Error creating event '%s': %s", event.get('title', 'Unknown'), e)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_insert, events))
+
+
+def _is_retryable_error(exception) -> bool:
+    """Return True if an insert failed due to rate limiting or a transient server error."""
+    if not isinstance(exception, HttpError):
+        return False
+    status = exception.resp.status
+    if status == 429 or status >= 500:
+        return True
+    if status == 403:
+        details = exception.error_details if isinstance(exception.error_details, list) else []
+        return any(isinstance(d, dict) and d.get("reason") in RATE_LIMIT_REASONS for d in details)
+    return False
+
+
+def _retry_delay(exception, attempt: int) -> float:
+    """Return how long to wait before retry number `attempt` of a failed request.
+
+    Uses the server's Retry-After header when it gives a number of seconds,
+    otherwise jittered exponential backoff; either way capped at RETRY_MAX_DELAY.
+    """
+    resp = getattr(exception, "resp", None)
+    try:
+        delay = float(resp.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        delay = 2 ** attempt + random.random()
+    return min(delay, RETRY_MAX_DELAY)
+
+
+def execute_with_retry(request, max_retries: int = BATCH_MAX_RETRIES):
+    """Execute a single API request, retrying rate-limit and transient errors after a backoff.
+
+    Non-retryable errors, and retryable ones after `max_retries` retries, are raised.
+    """
+    attempt = 0
+    waited = 0.0
+    while True:
+        try:
+            result = request.execute()
+            if waited:
+                log.info("Request succeeded after %d retries (%.1fs spent waiting)", attempt, waited)
+            return result
+        except Exception as e:
+            if attempt >= max_retries or not _is_retryable_error(e):
+                raise
+            attempt += 1
+            delay = _retry_delay(e, attempt)
+            log.warning("Request was rate limited, retrying in %.1fs (attempt %d/%d)", delay, attempt, max_retries)
+            time.sleep(delay)
+            waited += delay
+
+
+def create_google_events_batch(service, events: List[Dict], calendar_id: str = "primary", timezone: str = "America/Los_Angeles", credentials=None) -> List[Optional[Dict]]:
+    """Create many events in Google Calendar using batched HTTP requests.
+
+    Up to BATCH_SIZE inserts are sent in a single multipart/mixed request, so N events
+    cost ceil(N / BATCH_SIZE) round-trips instead of N.
+    Inserts rejected by rate limiting (403 rateLimitExceeded, 429) or transient 5xx errors
+    are re-queued into a new batch after an exponential backoff, up to BATCH_MAX_RETRIES times.
+    If a batch request is rejected and `credentials` is given, that chunk falls back to
+    concurrent individual inserts (see create_google_events_concurrently).
+    Returns a list parallel to `events`: the created event resource, or None if that insert failed.
+    """
+    results: List[Optional[Dict]] = [None] * len(events)
+
+    bodies = {}
+    for idx, event in enumerate(events):
+        try:
+            bodies[idx] = build_event_body(event, timezone)
+        except ValueError as e:
+            log.warning("Skipping event '%s': %s", event.get('title', 'Unknown'), e)
+
+    pending = list(bodies)
+    attempt = 0
+    waited = 0.0
+    while pending:
+        retry = []
+        retry_errors = []
+
+        def _collect(request_id, response, exception):
+            idx = int(request_id)
+            if exception is not None:
+                if attempt < BATCH_MAX_RETRIES and _is_retryable_error(exception):
+                    retry.append(idx)
+                    retry_errors.append(exception)
+                    return
+                log.error("Error creating event '%s': %s", events[idx].get('title', 'Unknown'), exception)
+                return
+            results[idx] = response
+
+        for chunk_start in range(0, len(pending), BATCH_SIZE):
+            chunk = pending[chunk_start:chunk_start + BATCH_SIZE]
+            batch = service.new_batch_http_request(callback=_collect)
+            for idx in chunk:
+                batch.add(service.events().insert(calendarId=calendar_id, body=bodies[idx]), request_id=str(idx))
+            try:
+                batch.execute()
+            except Exception as e:
+                if credentials is None:
+                    raise
+                log.warning("Batch request failed: %s, falling back to concurrent inserts", e)
+                chunk_results = create_google_events_concurrently(
+                    credentials, [events[idx] for idx in chunk], calendar_id=calendar_id, timezone=timezone
+                )
+                for idx, result in zip(chunk, chunk_results):
+                    results[idx] = result
+
+        if retry:
+            attempt += 1
+            # Wait out the longest Retry-After any of the rejected inserts asked for
+            delay = max(_retry_delay(e, attempt) for e in retry_errors)
+            log.warning("%d inserts were rate limited, retrying in %.1fs (attempt %d/%d)", len(retry), delay, attempt, BATCH_MAX_RETRIES)
+            time.sleep(delay)
+            waited += delay
+        pending = sorted(retry)
+
+    if waited:
+        log.info("Batch insert spent %.1fs waiting on rate limits over %d retries", waited, attempt)
+    return results
+
+
+def export_events_to_ics(events: Iterable[Dict], path: str = "events.ics") -> str:
     """Write events to an .ics file. Returns the path written.
 
-    Each event requires start and end datetimes and summary.
+    Each event requires start and end datetimes and summary. Events may come from
+    any iterable (including a generator); each VEVENT is written as soon as it is
+    built, so the whole calendar is never held in memory.
     """
+    # Only the CLI exports .ics files, so the web app never pays for this import
+    from icalendar import Calendar, Event
+
     cal = Calendar()
     cal.add("prodid", "-//CalHacks Event Export//mxm.dk//")
     cal.add("version", "2.0")
-
-    for ev in events:
-        ical_ev = Event()
-        ical_ev.add("summary", ev.get("title"))
-        ical_ev.add("description", ev.get("description"))
-        if ev.get("location"):
-            ical_ev.add("location", ev.get("location"))
-        # Use dateTime with timezone-aware datetimes if available; here we assume naive -> treat as local
-        ical_ev.add("dtstart", ev["start"])
-        ical_ev.add("dtend", ev["end"])
-        cal.add_component(ical_ev)
+    # Serialize the empty calendar once and write its components between BEGIN and END
+    prologue, end = cal.to_ical().rsplit(b"END:VCALENDAR", 1)
 
     with open(path, "wb") as f:
-        f.write(cal.to_ical())
+        f.write(prologue)
+        for ev in events:
+            ical_ev = Event()
+            ical_ev.add("summary", ev.get("title"))
+            ical_ev.add("description", ev.get("description"))
+            if ev.get("location"):
+                ical_ev.add("location", ev.get("location"))
+            # Use dateTime with timezone-aware datetimes if available; here we assume naive -> treat as local
+            ical_ev.add("dtstart", ev["start"])
+            ical_ev.add("dtend", ev["end"])
+            f.write(ical_ev.to_ical())
+        f.write(b"END:VCALENDAR" + end)
     return path
 
 
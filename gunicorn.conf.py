@@ -0,0 +1,19 @@
+"""Gunicorn settings for serving the Flask app in production.
+
+Usage:
+  gunicorn app:app
+
+Google Calendar and Gemini calls are network-bound, so threaded workers let
+requests overlap while waiting on the network. preload_app imports the app
+(and the Google/Gemini client libraries) once before forking workers.
+"""
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "4"))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+preload_app = True
+
+# Gemini image extraction can take several minutes per request
+timeout = 330
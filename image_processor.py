@@ -6,62 +6,317 @@ directly from images, which is more accurate than traditional OCR for complex do
 Requirements:
     - google-generativeai: Google's Gemini API with vision support
     - pillow: Image processing library
+
+Optional:
+    - pytesseract (plus the tesseract binary): images that are clean text, such as
+      screenshots of a PDF, are read locally and parsed as text instead of sent to
+      the vision model
+    - pyvips (plus libvips): faster, lower-memory image downscaling
 """
 
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, List, Optional
+from datetime import datetime
 from PIL import Image
+import hashlib
 import io
+import json
+import logging
 import os
+import random
+import tempfile
 import threading
-
-from parsers import extract_events_from_text
+import time
+
+from parsers import EVENTS_RESPONSE_CONFIG, GEMINI_RESPONSE_CACHE_DIR, convert_gemini_events, extract_events_from_text, extract_events_with_gemini, get_generative_model, iter_json_array, load_genai, stream_response_text
+
+try:
+    import pytesseract
+except ImportError:
+    # Optional local OCR pre-check; every image goes to Gemini Vision otherwise
+    pytesseract = None
+
+try:
+    import pyvips
+    # Each image is processed once, so don't keep decoded buffers around
+    pyvips.cache_set_max(0)
+except (ImportError, OSError):
+    # Optional: libvips shrinks on load and resizes on all cores; Pillow is used otherwise
+    pyvips = None
+
+log = logging.getLogger(__name__)
+
+
+# MIME types for the supported image extensions
+IMAGE_MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.bmp': 'image/bmp',
+    '.webp': 'image/webp'
+}
+SUPPORTED_IMAGE_FORMATS = tuple(IMAGE_MIME_TYPES)
+
+# Gemini Files API uploads are reused for identical images (keyed by SHA-256);
+# the cache file lives next to the cached text responses, which are already git-ignored
+GEMINI_FILE_CACHE_PATH = os.path.join(GEMINI_RESPONSE_CACHE_DIR, 'image_files.json')
+GEMINI_FILE_TTL = 47 * 60 * 60  # Uploaded files expire after 48 hours
+_gemini_file_cache_lock = threading.Lock()
+_file_discovery_patched = False
+# google-generativeai releases whose FileServiceClient _reuse_file_discovery_api was checked against
+FILE_DISCOVERY_PATCH_VERSIONS = ('0.8.',)
+_gemini_files = {}  # digest -> (file, expires), in-process copy of the cache
+
+# Images are downscaled to fit this box and re-encoded as JPEG before being sent to Gemini
+VISION_MAX_DIMENSION = 1536
+VISION_JPEG_QUALITY = 85
+
+# Stable aliases: every request goes to flash; pro is tried once if flash keeps failing
+GEMINI_PRIMARY_MODEL = 'models/gemini-flash-latest'
+GEMINI_ESCALATION_MODEL = 'models/gemini-pro-latest'
+# Per-attempt timeouts (seconds) for the primary model, enforced by the client
+GEMINI_REQUEST_TIMEOUTS = (30, 60, 120)
+
+
+# Local OCR text is used instead of the vision model only when it is this reliable
+OCR_MIN_CONFIDENCE = 80
+OCR_MIN_WORDS = 200
+OCR_TIMEOUT = 5  # seconds; Tesseract is killed and the image goes to Gemini Vision
 
 
-class TimeoutError(Exception):
-    pass
+def check_gemini_available() -> bool:
+    """Check if Gemini API is available.
+    
+    Returns:
+        True if GEMINI_API_KEY is set
+    """
+    return 'GEMINI_API_KEY' in os.environ
 
 
-def timeout_handler(func, timeout_seconds=60):
-    """Execute a function with a timeout using threading."""
-    result = [None]
-    exception = [None]
+def prepare_vision_image(image_data: bytes) -> bytes:
+    """Shrink an uploaded image into a compact JPEG for Gemini Vision.
+    
+    Transparent areas are flattened onto white, the image is downscaled to fit
+    within VISION_MAX_DIMENSION, and it is re-encoded as JPEG, so a large PNG
+    screenshot costs a fraction of the upload bytes.
     
-    def target():
+    Args:
+        image_data: The image file as bytes
+        
+    Returns:
+        The JPEG-encoded image as bytes
+    """
+    if pyvips is not None:
         try:
-            result[0] = func()
-        except Exception as e:
-            exception[0] = e
+            return _prepare_vision_image_vips(image_data)
+        except pyvips.Error as e:
+            log.debug("libvips could not prepare image (%s), using Pillow", e)
+    
+    image = Image.open(io.BytesIO(image_data))
+    scale = min(VISION_MAX_DIMENSION / image.width, VISION_MAX_DIMENSION / image.height)
+    if scale < 1:
+        # Lets the JPEG decoder skip straight to a 1/2-1/8 scale instead of
+        # decoding the full-resolution scan; a no-op for other formats
+        image.draft('RGB', (int(image.width * scale), int(image.height * scale)))
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    else:
+        image = image.convert('RGB')
     
-    thread = threading.Thread(target=target)
-    thread.daemon = True
-    thread.start()
+    if image.width > VISION_MAX_DIMENSION or image.height > VISION_MAX_DIMENSION:
+        log.debug("Resizing image from %s to fit within %dx%d", image.size, VISION_MAX_DIMENSION, VISION_MAX_DIMENSION)
+        image.thumbnail((VISION_MAX_DIMENSION, VISION_MAX_DIMENSION), Image.Resampling.LANCZOS)
     
-    # Add progress logging
-    import time
-    check_interval = 30  # Check every 30 seconds
-    elapsed = 0
-    while thread.is_alive() and elapsed < timeout_seconds:
-        thread.join(check_interval)
-        elapsed += check_interval
-        if thread.is_alive():
-            print(f"[Progress] API call still running... ({elapsed}s / {timeout_seconds}s)")
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=VISION_JPEG_QUALITY, optimize=True)
+    log.debug("Prepared %dx%d JPEG (%d bytes, from %d)", image.width, image.height, buffer.tell(), len(image_data))
+    return buffer.getvalue()
+
+
+def _prepare_vision_image_vips(image_data: bytes) -> bytes:
+    """prepare_vision_image() with libvips, which decodes and shrinks in one streamed pass."""
+    image = pyvips.Image.thumbnail_buffer(image_data, VISION_MAX_DIMENSION, size='down')
+    if image.interpretation != 'srgb':
+        image = image.colourspace('srgb')
+    if image.hasalpha():
+        image = image.flatten(background=[255, 255, 255])
+    payload = image.jpegsave_buffer(Q=VISION_JPEG_QUALITY, optimize_coding=True, strip=True)
+    log.debug("Prepared %dx%d JPEG with libvips (%d bytes, from %d)", image.width, image.height, len(payload), len(image_data))
+    return payload
+
+
+def _load_gemini_file_cache() -> Dict:
+    """Load the image hash -> Gemini file cache, or an empty dict if there is none."""
+    try:
+        with open(GEMINI_FILE_CACHE_PATH, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_gemini_file_cache(cache: Dict) -> None:
+    """Atomically write the image hash -> Gemini file cache; failures only cost a future re-upload."""
+    tmp_path = None
+    try:
+        os.makedirs(GEMINI_RESPONSE_CACHE_DIR, exist_ok=True)
+        # A temp file per writer, since several worker processes may save at once
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=GEMINI_RESPONSE_CACHE_DIR)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, GEMINI_FILE_CACHE_PATH)
+    except OSError as e:
+        log.warning("Could not save Gemini file cache: %s", e)
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def _reuse_file_discovery_api() -> None:
+    """Make the Files API client build its discovery service once per thread.
     
-    if thread.is_alive():
-        raise TimeoutError(f"Function timed out after {timeout_seconds} seconds")
+    google-generativeai's FileServiceClient checks an attribute it never sets, so
+    every upload downloads the discovery document over a new connection and
+    rebuilds the service. This skips the rebuild once the thread has one.
+    """
+    global _file_discovery_patched
+    with _gemini_file_cache_lock:
+        if _file_discovery_patched:
+            return
+        _file_discovery_patched = True
+    try:
+        import google.generativeai
+        from google.generativeai.client import FileServiceClient
+        setup = FileServiceClient._setup_discovery_api
+    except (ImportError, AttributeError):
+        return  # Other SDK versions manage this themselves
+    # The patch relies on private details checked against these releases only; on any
+    # other version uploads take the SDK's own (slower but correct) path
+    if not google.generativeai.__version__.startswith(FILE_DISCOVERY_PATCH_VERSIONS):
+        log.debug("Not patching Files API discovery for google-generativeai %s", google.generativeai.__version__)
+        return
     
-    if exception[0]:
-        raise exception[0]
+    # Safe because the wrapper only skips the rebuild when this thread already holds
+    # the built service, which is exactly what create_file reads next. That service is
+    # per client instance, and genai.configure() (a new API key) creates new clients,
+    # so a service built for another key is never reused.
+    def setup_once(self, *args, **kwargs):
+        if getattr(self._local, 'discovery_api', None) is None:
+            setup(self, *args, **kwargs)
     
-    return result[0]
+    FileServiceClient._setup_discovery_api = setup_once
 
 
-def check_gemini_available() -> bool:
-    """Check if Gemini API is available.
+def get_gemini_image_file(genai, image_data: bytes, mime_type: str):
+    """Get a Gemini Files API handle for an image, uploading it only if needed.
     
+    Images already uploaded (same SHA-256) within the last 47 hours are
+    referenced by name instead of being re-sent.
+    
+    Args:
+        genai: The configured google.generativeai module
+        image_data: The image file as bytes
+        mime_type: MIME type of the image
+        
     Returns:
-        True if GEMINI_API_KEY is set
+        The Gemini file, or None if it could not be uploaded
     """
-    return 'GEMINI_API_KEY' in os.environ
+    digest = hashlib.sha256(image_data).hexdigest()
+    now = time.time()
+    with _gemini_file_cache_lock:
+        # Files seen by this process are reused without a get_file round trip
+        memo = _gemini_files.get(digest)
+        if memo and memo[1] > now:
+            return memo[0]
+        entry = _load_gemini_file_cache().get(digest)
+    
+    if entry and entry['expires'] > now:
+        try:
+            image_file = genai.get_file(entry['name'])
+            log.debug("Reusing uploaded Gemini file %s", entry['name'])
+            with _gemini_file_cache_lock:
+                _gemini_files[digest] = (image_file, entry['expires'])
+            return image_file
+        except Exception as e:
+            log.info("Cached Gemini file %s unavailable (%s), re-uploading...", entry['name'], e)
+    
+    _reuse_file_discovery_api()
+    try:
+        image_file = genai.upload_file(io.BytesIO(image_data), mime_type=mime_type, display_name=digest)
+    except Exception as e:
+        log.warning("Gemini file upload failed (%s), sending image inline", e)
+        return None
+    log.debug("Uploaded image to Gemini as %s", image_file.name)
+    
+    with _gemini_file_cache_lock:
+        # Drop expired entries while rewriting the cache
+        cache = {k: v for k, v in _load_gemini_file_cache().items() if v['expires'] > now}
+        cache[digest] = {'name': image_file.name, 'uri': image_file.uri, 'expires': now + GEMINI_FILE_TTL}
+        _save_gemini_file_cache(cache)
+        _gemini_files[digest] = (image_file, now + GEMINI_FILE_TTL)
+    return image_file
+
+
+def _call_with_backoff(get_model, contents: List, **kwargs):
+    """Send a Gemini request, retrying transient errors with exponential backoff.
+    
+    Rate limits, timeouts and server errors are retried on the primary model with
+    growing timeouts. Errors retrying can't fix (bad request, unknown model, auth)
+    are raised at once. If the primary model still fails for a reason other than
+    rate limiting, the escalation model gets one attempt.
+    
+    Args:
+        get_model: Returns the GenerativeModel for a model name
+        contents: The request contents
+        **kwargs: Passed on to generate_content
+        
+    Returns:
+        The Gemini response
+    """
+    from google.api_core import exceptions as api_exceptions
+    permanent = (api_exceptions.BadRequest, api_exceptions.NotFound,
+                 api_exceptions.PermissionDenied, api_exceptions.Unauthenticated)
+    
+    def attempt(model_name, timeout):
+        log.debug("Sending request to %s with a %d second timeout...", model_name, timeout)
+        api_start_time = time.time()
+        response = get_model(model_name).generate_content(
+            contents, request_options={"timeout": timeout}, **kwargs
+        )
+        log.info("Got response from %s after %.1f seconds", model_name, time.time() - api_start_time)
+        return response
+    
+    last_error = None
+    for retry, timeout in enumerate(GEMINI_REQUEST_TIMEOUTS):
+        if retry:
+            wait = 2 ** (retry - 1) + random.random()
+            log.info("Retrying %s in %.1f seconds", GEMINI_PRIMARY_MODEL, wait)
+            time.sleep(wait)
+        try:
+            return attempt(GEMINI_PRIMARY_MODEL, timeout)
+        except permanent:
+            raise
+        except Exception as e:
+            log.warning("API error with %s: %s", GEMINI_PRIMARY_MODEL, e)
+            last_error = e
+    
+    if isinstance(last_error, api_exceptions.TooManyRequests):
+        raise last_error  # The escalation model shares the quota
+    log.info("%s kept failing, trying %s", GEMINI_PRIMARY_MODEL, GEMINI_ESCALATION_MODEL)
+    return attempt(GEMINI_ESCALATION_MODEL, GEMINI_REQUEST_TIMEOUTS[-1])
+
+
+# Generation settings for plain text transcription of an image
+TEXT_GENERATION_CONFIG = {
+    "temperature": 0.1,
+    "top_p": 0.8,
+    "top_k": 40,
+    "max_output_tokens": 8192,
+}
 
 
 def extract_text_from_image_gemini(image_data: bytes, mime_type: str = 'image/png') -> str:
@@ -84,64 +339,129 @@ def extract_text_from_image_gemini(image_data: bytes, mime_type: str = 'image/pn
         )
     
     try:
-        import google.generativeai as genai
-        
-        # Configure API
-        api_key = os.environ.get('GEMINI_API_KEY')
-        genai.configure(api_key=api_key)
-        
-        # Try different Gemini models that support vision
-        model_names = [
-            'models/gemini-1.5-flash',
-            'models/gemini-1.5-pro',
-            'models/gemini-pro-vision',
-            'models/gemini-2.0-flash-exp'
-        ]
-        
         prompt = """Extract all the text from this image of a syllabus or course schedule. 
 Return only the raw text content, preserving the structure and formatting as much as possible.
 Include all dates, times, events, assignments, and important information."""
         
-        for model_name in model_names:
-            try:
-                model = genai.GenerativeModel(model_name)
-                
-                # Configure for text extraction
-                generation_config = {
-                    "temperature": 0.1,
-                    "top_p": 0.8,
-                    "top_k": 40,
-                    "max_output_tokens": 8192,
-                }
-                
-                # Prepare the image
-                image_pil = Image.open(io.BytesIO(image_data))
-                
-                # Resize image if too large (Gemini has size limits)
-                MAX_DIMENSION = 1536  # Gemini's recommended max
-                if image_pil.width > MAX_DIMENSION or image_pil.height > MAX_DIMENSION:
-                    print(f"Resizing image from {image_pil.size} to fit within {MAX_DIMENSION}x{MAX_DIMENSION}")
-                    image_pil.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.Resampling.LANCZOS)
-                
-                # Generate content with image
-                response = model.generate_content(
-                    [prompt, image_pil],
-                    generation_config=generation_config
-                )
-                
-                return response.text
-                
-            except Exception as e:
-                print(f"Model {model_name} failed: {e}")
-                continue
-        
-        raise Exception("All Gemini vision models failed")
+        image_part = {'mime_type': 'image/jpeg', 'data': prepare_vision_image(image_data)}
+        response = _call_with_backoff(
+            lambda model_name: get_generative_model(model_name, TEXT_GENERATION_CONFIG),
+            [prompt, image_part],
+        )
+        return response.text
         
     except Exception as e:
         raise RuntimeError(f"Failed to extract text from image using Gemini: {str(e)}")
 
 
-def extract_events_from_image_gemini(image_data: bytes, mime_type: str = 'image/png') -> List[Dict]:
+# Pages sent together in one request by extract_events_from_images_batch()
+VISION_BATCH_SIZE = 8
+
+
+# Static extraction rules, sent as the model's system instruction so they are
+# identical across calls; only the short per-call message changes
+VISION_SYSTEM_PROMPT = """You extract calendar events from academic syllabi and course schedules.
+
+Extract all events, deadlines, exams, lectures, and important dates from the image(s). The same event may be mentioned in several places with different context; merge mentions you are sure refer to the same event, but keep separate midterms separate. Include anything academically related and never output duplicates.
+
+Classify each item:
+- "event": has specific start and end times (lectures, labs, discussions, exams, meetings, office hours)
+- "task": only has a due date (assignments, projects, homework, papers)
+
+Return a JSON array. Each item has:
+- type: "event" or "task"
+- title: short and descriptive, without the date or time
+- start_text: the start date/time as written, or the due date for tasks
+- end_text: the end date/time as written, "1 hour" for events without one, "0" for tasks
+- location: building and room, or "Online" if mentioned (usually empty for tasks)
+- description: for recurring items include the days of the week (e.g. "Lecture MWF", "Lab TTH", "Assignment Monday"); otherwise a category such as "Lecture", "Lab", "Exam", "Discussion", "Assignment", "Project"
+- recurring: true if the item repeats (weekly lectures, weekly assignments). Items given a day of the week (e.g. "M W") but no date are likely recurring
+
+Rules:
+1. Keep the document's date formats (don't convert to ISO unless necessary)
+2. For events without a time, assume 10am for classes and 3pm for exams
+3. For tasks, put the due date in start_text and set end_text to "0"
+4. Every item needs at least a name and a date"""
+
+# Output budget for one page; batches get more, up to the model limit
+VISION_MAX_OUTPUT_TOKENS = 4096
+VISION_MAX_OUTPUT_TOKENS_LIMIT = 8192
+
+VISION_GENERATION_CONFIG = {
+    "temperature": 0.1,
+    "top_p": 0.8,
+    "top_k": 40,
+    "max_output_tokens": VISION_MAX_OUTPUT_TOKENS,
+    **EVENTS_RESPONSE_CONFIG,
+}
+
+def _build_events_prompt(page_count: int = 1) -> str:
+    """Build the per-call message for one image or several pages of one syllabus."""
+    if page_count == 1:
+        source = "this image"
+    else:
+        source = (f"these {page_count} images, which are consecutive pages of the same document. "
+                  "List an event only once even if it appears on several pages")
+    return f"Extract the events from {source}.\nCurrent date: {datetime.now().date().isoformat()}\nReturn JSON array:"
+
+
+def _generate_vision_content(contents: List, page_count: int = 1):
+    """Send a streaming vision request for event extraction.
+    
+    Args:
+        contents: The per-call message and image parts
+        page_count: Number of page images, used to size the output budget
+        
+    Returns:
+        The Gemini response, iterable over its chunks
+    """
+    generation_config = None
+    if page_count > 1:
+        generation_config = dict(
+            VISION_GENERATION_CONFIG,
+            max_output_tokens=min(VISION_MAX_OUTPUT_TOKENS * page_count, VISION_MAX_OUTPUT_TOKENS_LIMIT),
+        )
+    
+    # The client fetches the first chunk before returning, so request errors are retried here
+    return _call_with_backoff(
+        lambda model_name: get_generative_model(model_name, VISION_GENERATION_CONFIG, VISION_SYSTEM_PROMPT),
+        contents,
+        generation_config=generation_config,
+        stream=True,
+    )
+
+
+def _parse_events_response(text_chunks: Iterable[str]) -> List[Dict]:
+    """Convert Gemini's JSON event list into event dicts with datetime start/end.
+    
+    Events are converted as they arrive, overlapping date parsing with the download.
+    
+    Args:
+        text_chunks: The streamed JSON array returned by structured output mode
+        
+    Returns:
+        List of events; items whose dates can't be parsed are skipped
+    """
+    # Convert to our format with proper datetime objects
+    return convert_gemini_events(iter_json_array(text_chunks))
+
+
+def _vision_image_part(genai, image_data: bytes, payload: Optional[bytes] = None):
+    """Prepare an image and return it as a Files API reference, or inline if the upload fails.
+    
+    payload is image_data already run through prepare_vision_image, if the caller has it.
+    """
+    if payload is None:
+        payload = prepare_vision_image(image_data)
+    # Prefer a Files API reference so retries of the same image skip the upload
+    image_part = get_gemini_image_file(genai, payload, 'image/jpeg')
+    if image_part is None:
+        image_part = {'mime_type': 'image/jpeg', 'data': payload}
+    return image_part
+
+
+def extract_events_from_image_gemini(image_data: bytes, mime_type: str = 'image/png',
+                                     payload: Optional[bytes] = None) -> List[Dict]:
     """Extract events directly from an image using Google Gemini Vision API.
     
     This uses Gemini's vision capabilities to understand the image and extract
@@ -150,17 +470,13 @@ def extract_events_from_image_gemini(image_data: bytes, mime_type: str = 'image/
     Args:
         image_data: The image file as bytes
         mime_type: MIME type of the image
+        payload: image_data already shrunk by prepare_vision_image, to avoid doing it twice
         
     Returns:
         List of extracted events
     """
-    import time
-    from datetime import datetime, timedelta
     start_time = time.time()
-    print("=" * 60)
-    print("Starting image processing with Gemini Vision...")
-    print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("=" * 60)
+    log.info("Starting image processing with Gemini Vision...")
     
     if not check_gemini_available():
         raise RuntimeError(
@@ -169,212 +485,124 @@ def extract_events_from_image_gemini(image_data: bytes, mime_type: str = 'image/
         )
     
     try:
-        import google.generativeai as genai
-        import json
-        import dateparser
-        
-        print("Gemini API key found, configuring API...")
-        
-        # Configure API
-        api_key = os.environ.get('GEMINI_API_KEY')
-        genai.configure(api_key=api_key)
-        
-        print("API configured successfully")
-        
-        # Build the prompt for event extraction (same as text processing)
-        current_date = datetime.now().isoformat()
-        prompt = f"""You are an expert at extracting calendar events from academic syllabi and course schedules.
-
-Extract all events, deadlines, exams, lectures, and important dates from this image. The same event can be referenced in various parts of the document, each with some context. Make sure to group these events if you are sure they are the same
-
-STEPS
-- SCAN: Initially go through the image and note important names that refer to events or tasks, make sure to get anything academically related
-- COLLECT: Collect info about events, grouping them by their names (make sure to distinguish separate midterms)
-- COLLECT A SECOND TIME QUICKLY: make sure to not make duplicates
-- OUTPUT: Output the events with enough info about them to be able to create a simple google calendar event
-
-CLASSIFY each item as either an "event" or "task":
-- EVENTS: Have specific start and end times (lectures, labs, discussions, exams, meetings, office hours)
-- TASKS: Only have due dates, no specific time needed (assignments, projects, homework, papers)
-
-Return a JSON array. Each item should have:
-- type: Either "event" or "task"
-- title: A short, descriptive title, do not include the date or time
-- start_text: The exact start date/time mentioned (keep original format) OR due date for tasks
-- end_text: The exact end date/time mentioned, or "1 hour" for events, "0" for tasks
-- location: Building name, room number, or "Online" if mentioned (usually empty for tasks)
-- description: For recurring events/tasks, include days of week (e.g., "Lecture MWF", "Lab TTH", "Assignment Monday"). For non-recurring: Category like "Lecture", "Lab", "Exam", "Discussion", "Assignment", "Project"
-- recurring: Boolean indicating if this event/task recurs (e.g., weekly lectures, weekly assignments, recurring meetings). Events/tasks for which there is not specified date but there is a day of the week (or multiple ex: M W (Every Monday and Wednesday)) are likely to be recurring
-
-Important rules:
-1. Use the text's actual date formats (don't convert to ISO unless necessary)
-2. For events without time, assume reasonable defaults (10am for classes, 3pm for exams)
-3. For tasks, use the due date as start_text and set end_text to "0"
-4. For recurring events or tasks, include days in description (e.g., "MWF", "TTH", "Monday Wednesday Friday", "Assignment Monday") so the recurrence pattern can be determined
-5. Return ONLY valid JSON, no markdown formatting
-6. Minimum event/task details: name, time, date
-
-Current date context: {current_date}
-
-Return JSON array:"""
-        
-        # Use models that explicitly support vision
-        model_names = [
-            'models/gemini-2.5-flash',  # Latest flash model
-            'models/gemini-2.0-flash',   # Stable flash model
-            'models/gemini-flash-latest', # Compatible version
-            'models/gemini-pro-latest',   # Pro version
-            'models/gemini-2.5-pro'       # Latest pro model
-        ]
+        genai = load_genai()
         
-        print(f"Preparing image (size: {len(image_data)} bytes)...")
-        image_pil = Image.open(io.BytesIO(image_data))
-        print(f"Image loaded successfully: {image_pil.size}")
+        log.debug("Preparing image (size: %d bytes)...", len(image_data))
+        image_part = _vision_image_part(genai, image_data, payload)
         
-        # Resize image if too large (Gemini has size limits)
-        MAX_DIMENSION = 1536  # Gemini's recommended max
-        if image_pil.width > MAX_DIMENSION or image_pil.height > MAX_DIMENSION:
-            print(f"Resizing image from {image_pil.size} to fit within {MAX_DIMENSION}x{MAX_DIMENSION}")
-            image_pil.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.Resampling.LANCZOS)
-            print(f"Image resized to: {image_pil.size}")
+        response = _generate_vision_content([_build_events_prompt(), image_part])
+        events = _parse_events_response(stream_response_text(response))
         
-        response = None
-        for model_name in model_names:
-            try:
-                print(f"Trying model: {model_name}...")
-                model = genai.GenerativeModel(model_name)
-                
-                # Configure for structured output
-                generation_config = {
-                    "temperature": 0.1,
-                    "top_p": 0.8,
-                    "top_k": 40,
-                    "max_output_tokens": 8192,
-                }
-                
-                print(f"Sending request to {model_name}...")
-                
-                # Generate content with image (with timeout handling)
-                try:
-                    # Wrap in a timeout function (5 minutes = 300 seconds)
-                    def call_api():
-                        print(f"API call started at {datetime.now().strftime('%H:%M:%S')}")
-                        return model.generate_content(
-                            [prompt, image_pil],
-                            generation_config=generation_config
-                        )
-                    
-                    print(f"Starting API call with timeout of 300 seconds (5 minutes)...")
-                    api_start_time = datetime.now()
-                    response = timeout_handler(call_api, timeout_seconds=300)
-                    elapsed = (datetime.now() - api_start_time).total_seconds()
-                    print(f"Successfully got response from {model_name} after {elapsed:.1f} seconds")
-                    break
-                except TimeoutError as timeout_err:
-                    print(f"Timeout with {model_name}: {timeout_err}")
-                    continue
-                except Exception as api_error:
-                    print(f"API error with {model_name}: {api_error}")
-                    # Check if it's a timeout or rate limit
-                    if "timeout" in str(api_error).lower() or "429" in str(api_error):
-                        print(f"Rate limit or timeout with {model_name}, trying next model...")
-                        continue
-                    raise  # Re-raise if it's a different error
-                
-            except Exception as model_error:
-                print(f"Model {model_name} failed: {model_error}")
-                continue
-        
-        if response is None:
-            raise Exception("All Gemini vision models failed")
-        
-        print("Received response, parsing...")
-        
-        # Extract JSON from response
-        response_text = response.text
-        print(f"Response length: {len(response_text)} characters")
-        
-        # Clean up the response (remove markdown code blocks if present)
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0]
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].split("```")[0]
+        total_time = time.time() - start_time
+        log.info("Processed %d events from image in %.1f seconds", len(events), total_time)
+        return events
         
-        print("Cleaned response, parsing JSON...")
+    except Exception as e:
+        total_time = time.time() - start_time
+        log.error("Image processing failed after %.1f seconds: %s", total_time, e)
+        raise RuntimeError(f"Failed to extract events from image using Gemini: {str(e)}")
+
+
+def extract_events_from_images_batch(image_data_list: List[bytes], batch_size: int = VISION_BATCH_SIZE) -> List[Dict]:
+    """Extract events from several pages of one syllabus with one Gemini request per batch.
+    
+    Up to `batch_size` pages share a single request, so the prompt is sent once per
+    batch instead of once per page, and Gemini can merge events repeated across pages.
+    
+    Args:
+        image_data_list: The page images as bytes, in page order
+        batch_size: Maximum number of pages per request
         
-        # Parse JSON (dateparser and timedelta already imported above)
-        events_raw = json.loads(response_text.strip())
-        print(f"Parsed {len(events_raw)} events from JSON")
+    Returns:
+        List of extracted events from all pages
+    """
+    start_time = time.time()
+    log.info("Starting batched image processing of %d pages with Gemini Vision...", len(image_data_list))
+    
+    if not check_gemini_available():
+        raise RuntimeError(
+            "GEMINI_API_KEY is not set. "
+            "Please set it in your .env file or environment variables."
+        )
+    
+    try:
+        genai = load_genai()
         
-        # Convert to our format with proper datetime objects
         events = []
-        for idx, event_raw in enumerate(events_raw):
-            try:
-                event_type = event_raw.get('type', 'event')
-                
-                # Parse start time
-                start_text = event_raw.get('start_text', '')
-                start_dt = dateparser.parse(start_text, settings={"PREFER_DATES_FROM": "future"})
-                
-                if not start_dt:
-                    continue  # Skip if we can't parse the date
-                
-                # Handle events vs tasks differently
-                if event_type == 'task':
-                    # Tasks are all-day events
-                    end_dt = start_dt
-                else:
-                    # Parse end time for events
-                    end_text = event_raw.get('end_text', '1 hour')
-                    if end_text == '0' or end_text.lower() == 'none':
-                        end_dt = start_dt  # All-day event
-                    elif 'hour' in end_text.lower() or 'hr' in end_text.lower():
-                        # Extract number of hours
-                        try:
-                            hours = float(''.join(filter(str.isdigit, end_text.split()[0])))
-                            end_dt = start_dt + timedelta(hours=hours)
-                        except:
-                            end_dt = start_dt + timedelta(hours=1)
-                    else:
-                        end_dt = dateparser.parse(end_text, settings={"PREFER_DATES_FROM": "future"})
-                        if not end_dt:
-                            end_dt = start_dt + timedelta(hours=1)
-                
-                # Get recurring flag (can be True for both events and tasks)
-                recurring = event_raw.get('recurring', False)
-                
-                event = {
-                    "title": event_raw.get('title', 'Event'),
-                    "start": start_dt,
-                    "end": end_dt,
-                    "description": event_raw.get('description', ''),
-                    "location": event_raw.get('location'),
-                    "type": event_type,
-                    "all_day": (event_type == 'task' or end_dt == start_dt),
-                    "recurring": recurring
-                }
-                events.append(event)
-                recurring_status = "♻️ Recurring" if recurring else "One-time"
-                print(f"Successfully parsed event {idx + 1}/{len(events_raw)}: {event['title']} ({recurring_status})")
-            except Exception as e:
-                print(f"Error parsing event {idx + 1}: {e}")
-                continue
+        for batch_start in range(0, len(image_data_list), batch_size):
+            batch = image_data_list[batch_start:batch_start + batch_size]
+            image_parts = [_vision_image_part(genai, image_data) for image_data in batch]
+            response = _generate_vision_content([_build_events_prompt(len(batch)), *image_parts], len(batch))
+            events.extend(_parse_events_response(stream_response_text(response)))
         
         total_time = time.time() - start_time
-        print("=" * 60)
-        print(f"Successfully processed {len(events)} events from image")
-        print(f"Total processing time: {total_time:.1f} seconds ({total_time/60:.1f} minutes)")
-        print(f"End time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print("=" * 60)
+        log.info("Processed %d events from %d pages in %.1f seconds", len(events), len(image_data_list), total_time)
         return events
         
     except Exception as e:
         total_time = time.time() - start_time
-        print("=" * 60)
-        print(f"ERROR: Failed after {total_time:.1f} seconds ({total_time/60:.1f} minutes)")
-        print(f"Error: {str(e)}")
-        print("=" * 60)
-        raise RuntimeError(f"Failed to extract events from image using Gemini: {str(e)}")
+        log.error("Batched image processing failed after %.1f seconds: %s", total_time, e)
+        raise RuntimeError(f"Failed to extract events from images using Gemini: {str(e)}")
+
+
+def extract_text_locally(image_data: bytes) -> Optional[str]:
+    """Read an image with local OCR, if it is clearly a page of text.
+    
+    Args:
+        image_data: The image as bytes, normally the downscaled JPEG from
+            prepare_vision_image so Tesseract never works on a full-resolution photo
+        
+    Returns:
+        The recognized text, or None if OCR is unavailable or not confident enough
+    """
+    if pytesseract is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            data = pytesseract.image_to_data(
+                img.convert('L'), config='--psm 6', output_type=pytesseract.Output.DICT, timeout=OCR_TIMEOUT
+            )
+    except Exception as e:
+        log.debug("Local OCR unavailable: %s", e)
+        return None
+    
+    # Non-word boxes have confidence -1; keep line breaks so dates stay with their lines
+    lines = {}
+    confidences = []
+    for word, conf, block, par, line in zip(data['text'], data['conf'], data['block_num'], data['par_num'], data['line_num']):
+        if float(conf) < 0 or not word.strip():
+            continue
+        confidences.append(float(conf))
+        lines.setdefault((block, par, line), []).append(word)
+    
+    if len(confidences) <= OCR_MIN_WORDS:
+        return None
+    mean_confidence = sum(confidences) / len(confidences)
+    if mean_confidence <= OCR_MIN_CONFIDENCE:
+        log.debug("Local OCR confidence %.0f too low, using Gemini Vision", mean_confidence)
+        return None
+    log.info("Read %d words locally (confidence %.0f), skipping Gemini Vision", len(confidences), mean_confidence)
+    return '\n'.join(' '.join(words) for words in lines.values())
+
+
+def _extract_events_text_first(image_data: bytes, mime_type: str) -> List[Dict]:
+    """Parse clean text images as text, and send everything else to Gemini Vision."""
+    if pytesseract is None:
+        return extract_events_from_image_gemini(image_data, mime_type)
+    # OCR reads the same shrunk JPEG the vision request would send, so the
+    # full-resolution image is decoded once and a failed OCR check stays cheap
+    payload = prepare_vision_image(image_data)
+    text = extract_text_locally(payload)
+    if text:
+        return extract_events_with_gemini(text)
+    return extract_events_from_image_gemini(image_data, mime_type, payload)
+
+
+def _read_image_file(path: str):
+    """Read an image file, returning its bytes and its MIME type from the extension."""
+    with open(path, 'rb') as f:
+        image_data = f.read()
+    return image_data, IMAGE_MIME_TYPES.get(os.path.splitext(path)[1].lower(), 'image/png')
 
 
 def process_image_file(file_path: str) -> str:
@@ -386,21 +614,7 @@ def process_image_file(file_path: str) -> str:
     Returns:
         Extracted text from the image
     """
-    with open(file_path, 'rb') as f:
-        image_data = f.read()
-    
-    # Determine MIME type from file extension
-    ext = file_path.lower().split('.')[-1]
-    mime_types = {
-        'png': 'image/png',
-        'jpg': 'image/jpeg',
-        'jpeg': 'image/jpeg',
-        'gif': 'image/gif',
-        'bmp': 'image/bmp',
-        'webp': 'image/webp'
-    }
-    mime_type = mime_types.get(ext, 'image/png')
-    
+    image_data, mime_type = _read_image_file(file_path)
     return extract_text_from_image_gemini(image_data, mime_type)
 
 
@@ -415,22 +629,8 @@ def extract_events_from_image(image_path: str) -> List[Dict]:
     Returns:
         List of extracted events
     """
-    with open(image_path, 'rb') as f:
-        image_data = f.read()
-    
-    # Determine MIME type from file extension
-    ext = image_path.lower().split('.')[-1]
-    mime_types = {
-        'png': 'image/png',
-        'jpg': 'image/jpeg',
-        'jpeg': 'image/jpeg',
-        'gif': 'image/gif',
-        'bmp': 'image/bmp',
-        'webp': 'image/webp'
-    }
-    mime_type = mime_types.get(ext, 'image/png')
-    
-    return extract_events_from_image_gemini(image_data, mime_type)
+    image_data, mime_type = _read_image_file(image_path)
+    return _extract_events_text_first(image_data, mime_type)
 
 
 def extract_events_from_image_bytes(image_data: bytes, mime_type: str = 'image/png') -> List[Dict]:
@@ -443,7 +643,7 @@ def extract_events_from_image_bytes(image_data: bytes, mime_type: str = 'image/p
     Returns:
         List of extracted events
     """
-    return extract_events_from_image_gemini(image_data, mime_type)
+    return _extract_events_text_first(image_data, mime_type)
 
 
 def get_supported_image_formats() -> tuple:
@@ -452,7 +652,7 @@ def get_supported_image_formats() -> tuple:
     Returns:
         Tuple of supported file extensions
     """
-    return ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp')
+    return SUPPORTED_IMAGE_FORMATS
 
 
 if __name__ == "__main__":
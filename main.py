@@ -3,6 +3,7 @@
 Usage examples:
   python main.py --input examples/sample_input.txt --ics out.ics
   python main.py --input examples/sample_input.txt --google --calendar-id primary
+  python main.py --input scanned_pages/ --ics out.ics   (page images, needs GEMINI_API_KEY)
 
 Before using --google, follow README to create `credentials.json` and enable Calendar API.
 """
@@ -14,12 +15,20 @@ import sys
 from parsers import extract_events_from_text
 
 try:
-	from calendar_utils import create_google_service, create_google_event, export_events_to_ics
+	from image_processor import extract_events_from_images_batch, get_supported_image_formats
+except Exception:
+	# Image input needs Pillow and the Gemini client; text input works without them.
+	extract_events_from_images_batch = None
+	get_supported_image_formats = None
+
+try:
+	from calendar_utils import create_google_service, create_google_events_batch, export_events_to_ics, load_cached_credentials
 except Exception:
 	# We'll only error if the user tries to push or export; keep imports lazy.
 	create_google_service = None
-	create_google_event = None
+	create_google_events_batch = None
 	export_events_to_ics = None
+	load_cached_credentials = None
 
 
 def read_input_text(path: str) -> str:
@@ -31,17 +40,39 @@ def read_input_text(path: str) -> str:
 	return p.read_text(encoding="utf-8")
 
 
+def is_image_input(path: str) -> bool:
+	"""True if the input is a directory of page images or a single image file."""
+	if path == "-" or get_supported_image_formats is None:
+		return False
+	p = Path(path)
+	return p.is_dir() or p.suffix.lower() in get_supported_image_formats()
+
+
+def read_input_images(path: str) -> list:
+	"""Read one image, or every image in a directory in file-name order, as bytes."""
+	p = Path(path)
+	if not p.exists():
+		raise FileNotFoundError(f"Input file not found: {path}")
+	if not p.is_dir():
+		return [p.read_bytes()]
+	formats = get_supported_image_formats()
+	return [f.read_bytes() for f in sorted(p.iterdir()) if f.suffix.lower() in formats]
+
+
 def main():
 	parser = argparse.ArgumentParser(description="Extract events from text and create calendar events or export .ics")
-	parser.add_argument("--input", "-i", required=True, help="Input text file path or '-' to read stdin")
+	parser.add_argument("--input", "-i", required=True, help="Input text file path, '-' to read stdin, or an image file / directory of page images")
 	parser.add_argument("--google", action="store_true", help="Push extracted events to Google Calendar (requires credentials.json)")
 	parser.add_argument("--calendar-id", default="primary", help="Google Calendar ID, default 'primary'")
 	parser.add_argument("--ics", help="Write extracted events to an .ics file (Apple Calendar import)")
 	parser.add_argument("--dry-run", action="store_true", help="Don't create events; just show parsed results")
 	args = parser.parse_args()
 
-	text = read_input_text(args.input)
-	events = extract_events_from_text(text)
+	if is_image_input(args.input):
+		# All pages go to Gemini together so events repeated across pages are merged
+		events = extract_events_from_images_batch(read_input_images(args.input))
+	else:
+		events = extract_events_from_text(read_input_text(args.input))
 
 	if not events:
 		print("No event-like dates found in input.")
@@ -67,13 +98,16 @@ def main():
 		if args.dry_run:
 			print("Dry run: skipping Google Calendar push")
 			return
-		# Create service and push events
+		# Create service and push events, up to 50 inserts per batch request
 		service = create_google_service()
-		created = []
-		for e in events:
-			res = create_google_event(service, e, calendar_id=args.calendar_id)
-			created.append(res.get("htmlLink"))
-			print("Created:", res.get("htmlLink"))
+		results = create_google_events_batch(
+			service, events, calendar_id=args.calendar_id, credentials=load_cached_credentials()
+		)
+		for e, res in zip(events, results):
+			if res is None:
+				print("Failed:", e["title"])
+			else:
+				print("Created:", res.get("htmlLink"))
 
 
 if __name__ == "__main__":
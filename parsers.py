@@ -6,58 +6,508 @@ description, location).
 
 Improve by using an NLP model or rule engine for production.
 """
-from typing import List, Dict, Optional
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 import dateparser.search
 from dateparser import parse as parse_date
 from datetime import timedelta, datetime
+import bisect
+import functools
+import hashlib
 import os
+import re
 import json
+import tempfile
+import logging
+import threading
+import time
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    # orjson is only a speedup for parsing Gemini responses
+    _json_loads = json.loads
 
-def _extract_sentence(text: str, start_idx: int, end_idx: int) -> str:
+log = logging.getLogger(__name__)
+
+# Syllabi are English; fixing the language skips dateparser's per-chunk language detection
+DATEPARSER_LANGUAGES = ['en']
+
+# Gemini structured output for event extraction: the model returns bare JSON
+# matching this schema, so responses need no markdown cleanup before parsing
+EVENTS_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "type": {"type": "string", "format": "enum", "enum": ["event", "task"]},
+            "title": {"type": "string"},
+            "start_text": {"type": "string"},
+            "end_text": {"type": "string"},
+            "location": {"type": "string", "nullable": True},
+            "description": {"type": "string"},
+            "recurring": {"type": "boolean"},
+        },
+        "required": ["type", "title", "start_text", "end_text", "description", "recurring"],
+    },
+}
+EVENTS_RESPONSE_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": EVENTS_RESPONSE_SCHEMA,
+}
+
+_NEWLINE_RE = re.compile(r"\n")
+
+# Cheap test for anything search_dates could turn into a real date: a digit, am/pm,
+# or a month, weekday or relative-time word. Text without any of these only yields
+# false matches such as "We" read as Wednesday, so it is skipped.
+_TEMPORAL_RE = re.compile(
+    r"\d|\b(?:[ap]\.?m"
+    r"|jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+    r"|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?"
+    r"|(?:mon|tues?|wed(?:nes)?|thu(?:rs)?|fri|sat(?:ur)?|sun)(?:day)?s?"
+    r"|today|tomorrow|yesterday|tonight|now|noon|midnight|next|last|ago"
+    r"|(?:week|fortnight|month|year|day|hour|hr|minute|min|second|sec)s?|weekly|weekend"
+    r"|decades?|century|morning|afternoon|evening|night)\b",
+    re.I,
+)
+
+# Durations such as "2 hours", "1.5 hrs" in Gemini's end_text
+_HOUR_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:hour|hr)", re.I)
+
+# Structured date forms read without dateparser by _regex_search_dates. Each
+# pattern captures (year, month, day) groups in the order given by its entry;
+# a leading weekday ("Wed Sep 3") is part of the match so it isn't left behind
+# for search_dates as a date of its own.
+_WEEKDAY_PREFIX = r"(?:(?:mon|tues?|wed(?:nes)?|thu(?:rs?)?|fri|sat(?:ur)?|sun)(?:day)?\.?,?[ \t]+)?"
+_MONTH_NAME = (
+    r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+    r"|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?"
+)
+_DATE_PATTERNS = (
+    # 2025-09-03
+    (re.compile(r"\b" + _WEEKDAY_PREFIX + r"(\d{4})-(\d{1,2})-(\d{1,2})\b", re.I), ("year", "month", "day")),
+    # 9/3/2025, 9/3/25 (US month-first, as dateparser reads English)
+    (re.compile(r"\b" + _WEEKDAY_PREFIX + r"(\d{1,2})/(\d{1,2})/(\d{4}|\d{2})\b", re.I), ("month", "day", "year")),
+    # Sep 3, Sept. 3rd, 2025, September 3 2025, November 27-29, 2025 (a range starts on its first day)
+    (re.compile(
+        r"\b" + _WEEKDAY_PREFIX + _MONTH_NAME + r"[ \t]+(\d{1,2})(?:st|nd|rd|th)?\b"
+        r"(?:[ \t]*[-–][ \t]*\d{1,2}(?:st|nd|rd|th)?\b)?(?:,?[ \t]+(\d{4})\b)?",
+        re.I,
+    ), ("month", "day", "year")),
+    # 3 September 2025, 3rd of Sep, 2025
+    (re.compile(
+        r"\b" + _WEEKDAY_PREFIX + r"(\d{1,2})(?:st|nd|rd|th)?[ \t]+(?:of[ \t]+)?" + _MONTH_NAME + r",?[ \t]+(\d{4})\b",
+        re.I,
+    ), ("day", "month", "year")),
+)
+# A clock time later on a date's line ("due by 8pm", "from 7-9pm", "10:00am - 12:00pm");
+# for a range the start is used, taking its am/pm from the end if it has none.
+_LINE_TIME_RE = re.compile(
+    r"\b(\d{1,2})(?::(\d{2}))?[ \t]*(?:([ap])\.?m\.?[ \t]*)?"
+    r"(?:(?:-|–|to)[ \t]*\d{1,2}(?::\d{2})?[ \t]*)?([ap])\.?m\b\.?",
+    re.I,
+)
+_MONTH_NUMBERS = {name: number for number, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), 1)}
+
+# Models tried in order by extract_events_with_gemini (free tier)
+TEXT_EVENT_MODELS = (
+    'models/gemini-2.5-flash',  # Latest flash model
+    'models/gemini-2.0-flash',   # Stable flash model
+    'models/gemini-flash-latest', # Compatible version
+    'models/gemini-pro-latest',   # Pro version
+    'models/gemini-2.5-pro'       # Latest pro model
+)
+# Gemini responses are cached on disk, keyed by prompt version, reference date and text,
+# so re-uploading a syllabus on the same day (or with the same base_date) skips the API.
+# Entries older than the TTL are swept whenever a new response is saved.
+GEMINI_RESPONSE_CACHE_DIR = 'gemini_cache'
+GEMINI_RESPONSE_TTL = 7 * 24 * 60 * 60
+# Bump when the extraction prompt or response schema changes, to ignore older entries
+EVENTS_PROMPT_VERSION = 2
+
+# Static extraction rules for extract_events_with_gemini, sent as the system instruction
+TEXT_EVENTS_PROMPT = """You are an expert at extracting calendar events from academic syllabi and course schedules.
+
+Extract all events, deadlines, exams, lectures, and important dates from the following text. The same event can be referenced in various parts of the text, each with some context. Make sure to group these events if you are sure they are the same
+
+STEPS
+- SCAN: Initially go through the text and note important names that refer to events or tasks, make sure to get anything accademically related
+- COLLECT: Collect info about events, grouping them by their names (make sure to distinguish seperate midterms)
+- COLLECT A SECOND TIME QUICKLY: make sure to not make duplicates
+- OUPUT: Output the events with enough info about them to be able to create a simple google calendar event
+
+CLASSIFY each item as either an "event" or "task":
+- EVENTS: Have specific start and end times (lectures, labs, discussions, exams, meetings, office hours)
+- TASKS: Only have due dates, no specific time needed (assignments, projects, homework, papers)
+
+Return a JSON array. Each item should have:
+- type: Either "event" or "task"
+- title: A short, descriptive title, do not include the date or time
+- start_text: The exact start date/time mentioned (keep original format) OR due date for tasks
+- end_text: The exact end date/time mentioned OR EXACTLY 1 HOUR AFTER start_text
+- location: Building name, room number, or "Online" if mentioned (usually empty for tasks)
+- description: For recurring events/tasks, include days of week (e.g., "Lecture MWF", "Lab TTH", "Assignment Monday"). For non-recurring: Category like "Lecture", "Lab", "Exam", "Discussion", "Assignment", "Project"
+- recurring: Boolean indicating if this event/task recurs (e.g., weekly lectures, weekly assignments, recurring meetings). Events/tasks for which there is not specified date but there is a day of the week (or multiple ex: M W (Every Monday and Wednesday)) are likely to be recurring
+
+Important rules:
+1. Use the text's actual date formats (don't convert to ISO unless necessary)
+2. For events without time, assume reasonable defaults (10am for classes, 3pm for exams)
+3. For tasks, use the due date as start_text and set end_text to "0"
+4. For recurring events or tasks, include days in description (e.g., "MWF", "TTH", "Monday Wednesday Friday", "Assignment Monday") so the recurrence pattern can be determined
+5. Minimum event/task details: name, time, date"""
+
+# Model that last answered, tried first next time so dead models aren't retried on every call
+_last_good_model = None
+
+# API key google.generativeai is currently configured with; see load_genai()
+_genai_api_key = None
+_genai_lock = threading.Lock()
+
+# GenerativeModel instances reused across calls; see get_generative_model()
+_generative_models = {}
+
+
+def load_genai():
+    """Import google.generativeai, configured with GEMINI_API_KEY.
+
+    genai.configure() discards the cached API clients, so it only runs again
+    when the key changes instead of rebuilding the client on every call.
+    """
+    global _genai_api_key
+    import google.generativeai as genai
+
+    api_key = os.environ.get('GEMINI_API_KEY')
+    with _genai_lock:
+        if api_key != _genai_api_key:
+            genai.configure(api_key=api_key)
+            _genai_api_key = api_key
+    return genai
+
+
+def get_generative_model(model_name: str, generation_config: Optional[Dict] = None,
+                         system_instruction: Optional[str] = None):
+    """Return a GenerativeModel, reusing the one built earlier with the same settings.
+
+    generation_config is keyed by identity, so pass a module-level constant.
+    Models hold on to the API client, so a new key gets new models.
+    """
+    genai = load_genai()
+    key = (model_name, id(generation_config), system_instruction, _genai_api_key)
+    with _genai_lock:
+        model = _generative_models.get(key)
+        if model is None:
+            model = genai.GenerativeModel(
+                model_name,
+                generation_config=generation_config,
+                system_instruction=system_instruction,
+            )
+            _generative_models[key] = model
+        return model
+
+
+# Complete dates (with a year) in the shapes Gemini usually copies from syllabi.
+# Strings without a year depend on PREFER_DATES_FROM, so those go to dateparser.
+_DATE_FORMATS = tuple(
+    date_format + time_format
+    for date_format in ("%m/%d/%Y", "%B %d, %Y", "%b %d, %Y", "%B %d %Y", "%b %d %Y")
+    for time_format in ("", " %I:%M %p", " %I:%M%p", " %I%p", " at %I:%M %p", " at %I:%M%p", " at %I%p")
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_date_parser():
+    """Shared DateDataParser, so locale data is loaded once instead of per parse."""
+    from dateparser.date import DateDataParser
+    return DateDataParser(languages=DATEPARSER_LANGUAGES, settings={"PREFER_DATES_FROM": "future"})
+
+
+def _parse_date_text(text: str) -> Optional[datetime]:
+    """Parse a single date/time string, or return None."""
+    if not text:
+        return None
+    # Relative strings ("Monday", "Oct 5") resolve against today, so cache per day
+    return _parse_date_text_cached(text.strip(), datetime.now().date())
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date_text_cached(text: str, today) -> Optional[datetime]:
+    """Parse a stripped date string; memoized since recurring items repeat the same text."""
+    # Exact formats are far cheaper than dateparser's full pipeline
+    try:
+        parsed = datetime.fromisoformat(text)
+        if parsed.tzinfo is None:
+            return parsed
+    except ValueError:
+        pass
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    return _get_date_parser().get_date_data(text).date_obj
+
+
+def convert_gemini_event(event_raw: Dict) -> Optional[Dict]:
+    """Convert one item of Gemini's event JSON into an event dict with datetime start/end.
+
+    Returns None if the start date can't be parsed.
+    """
+    event_type = event_raw.get('type', 'event')
+
+    start_dt = _parse_date_text(event_raw.get('start_text', ''))
+    if not start_dt:
+        return None
+
+    # Handle events vs tasks differently
+    if event_type == 'task':
+        # Tasks are all-day events
+        end_dt = start_dt
+    else:
+        end_text = event_raw.get('end_text', '1 hour')
+        end_lower = end_text.lower()
+        hours = _HOUR_RE.search(end_text)
+        if end_text == '0' or end_lower == 'none':
+            end_dt = start_dt  # All-day event
+        elif hours:
+            end_dt = start_dt + timedelta(hours=float(hours.group(1)))
+        elif 'hour' in end_lower or 'hr' in end_lower:
+            end_dt = start_dt + timedelta(hours=1)
+        else:
+            end_dt = _parse_date_text(end_text) or start_dt + timedelta(hours=1)
+
+    return {
+        "title": event_raw.get('title', 'Event'),
+        "start": start_dt,
+        "end": end_dt,
+        "description": event_raw.get('description', ''),
+        "location": event_raw.get('location'),
+        "type": event_type,
+        "all_day": (event_type == 'task' or end_dt == start_dt),
+        # Can be True for both events and tasks
+        "recurring": event_raw.get('recurring', False)
+    }
+
+
+def convert_gemini_events(events_raw: Iterable[Dict]) -> List[Dict]:
+    """Convert Gemini's event JSON items with convert_gemini_event, skipping bad and repeated items.
+
+    Shared by the text and vision paths so both go through one conversion loop.
+    """
+    events = []
+    seen = set()
+    for idx, event_raw in enumerate(events_raw):
+        # Repeated items (same title and start) are dropped before any date parsing
+        key = (event_raw.get('title'), event_raw.get('start_text'))
+        if key in seen:
+            continue
+        seen.add(key)
+        try:
+            event = convert_gemini_event(event_raw)
+        except Exception as e:
+            log.warning("Error parsing event %d: %s", idx + 1, e)
+            continue
+        if not event:
+            continue  # Skip if we can't parse the date
+        events.append(event)
+        recurring_status = "♻️ Recurring" if event['recurring'] else "One-time"
+        log.debug("Parsed event %d: %s (%s)", idx + 1, event['title'], recurring_status)
+    return events
+
+
+def stream_response_text(response) -> Iterator[str]:
+    """Yield the text of each streamed response chunk, skipping chunks without parts."""
+    for chunk in response:
+        if chunk.parts:
+            yield chunk.text
+
+
+def iter_json_array(text_chunks: Iterable[str]) -> Iterator[Dict]:
+    """Yield the items of a JSON array as soon as each one has fully arrived.
+
+    text_chunks: the array's text, split at arbitrary points (e.g. a streamed response).
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = finished = False
+    for chunk in text_chunks:
+        buffer += chunk
+        pos = 0
+        while True:
+            # Skip whitespace and the separators between items
+            while pos < len(buffer) and (buffer[pos].isspace() or (started and buffer[pos] == ',')):
+                pos += 1
+            if pos == len(buffer) or finished:
+                break
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError(f"Expected a JSON array, got {buffer[pos:pos + 20]!r}")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                finished = True
+                pos += 1
+                continue
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # Item not complete yet
+            yield item
+        buffer = buffer[pos:]
+    if not finished:
+        raise ValueError("Truncated JSON array in Gemini response")
+
+
+def _line_starts(text: str) -> List[int]:
+    """Offsets where each line of text begins, for _extract_sentence lookups."""
+    return [0] + [m.end() for m in _NEWLINE_RE.finditer(text)]
+
+
+def _extract_sentence(text: str, start_idx: int, end_idx: int, line_starts: List[int]) -> str:
     # Return the sentence containing the matched span (approximate).
     # Split on line breaks or punctuation to keep it simple.
-    left = text.rfind("\n", 0, start_idx)
-    if left == -1:
-        left = 0
-    else:
-        left += 1
-    right = text.find("\n", end_idx)
-    if right == -1:
-        right = len(text)
+    left = line_starts[bisect.bisect_right(line_starts, start_idx) - 1]
+    # The line after the match starts just past the newline that ends it
+    next_line = bisect.bisect_left(line_starts, end_idx + 1)
+    right = line_starts[next_line] - 1 if next_line < len(line_starts) else len(text)
     return text[left:right].strip()
 
 
-def extract_events_from_text(text: str, base_date: Optional[str] = None) -> List[Dict]:
-    """Extract a list of event dicts from free text.
+def _regex_date(fields: Dict[str, str], relative_base: datetime) -> Optional[datetime]:
+    """Build the datetime for one _DATE_PATTERNS match, or None if it isn't a real date."""
+    month = fields["month"]
+    month = int(month) if month.isdigit() else _MONTH_NUMBERS[month[:3].lower()]
+    day = int(fields["day"])
+    try:
+        year = fields["year"]
+        if year:
+            year = int(year)
+            return datetime(year + 2000 if year < 100 else year, month, day)
+        # No year given: the next occurrence, like dateparser's PREFER_DATES_FROM future
+        dt = datetime(relative_base.year, month, day)
+        return dt if dt >= relative_base else dt.replace(year=dt.year + 1)
+    except ValueError:
+        return None
 
-    Returns events with keys: title, start (datetime), end (datetime), description, location
 
-    base_date: optional reference date for relative date parsing (ISO string) — passed to dateparser.
+def _regex_search_dates(text: str, relative_base: datetime) -> Tuple[List[Tuple[int, str, datetime]], str]:
+    """Find structured dates (ISO, M/D/Y, month-name forms) with regexes alone.
+
+    Returns (offset, matched_text, datetime) tuples in text order, and the text with
+    those dates (and any times taken from their lines) blanked out for search_dates.
+    """
+    spans = []
+    for pattern, order in _DATE_PATTERNS:
+        for m in pattern.finditer(text):
+            dt = _regex_date(dict(zip(order, m.groups())), relative_base)
+            if dt:
+                spans.append((m.start(), m.end(), dt))
+
+    # Keep the earliest match where patterns overlap
+    dates = []
+    last_end = -1
+    for start, end, dt in sorted(spans, key=lambda span: (span[0], -span[1])):
+        if start >= last_end:
+            dates.append((start, end, dt))
+            last_end = end
+
+    found = []
+    blanked = []
+    for i, (start, end, dt) in enumerate(dates):
+        blanked.append((start, end))
+        # Take a time from the rest of the line, up to the next date on it
+        line_end = text.find("\n", end)
+        window_end = len(text) if line_end == -1 else line_end
+        if i + 1 < len(dates):
+            window_end = min(window_end, dates[i + 1][0])
+        time_match = _LINE_TIME_RE.search(text, end, window_end)
+        if time_match:
+            hour, minute, meridiem, end_meridiem = time_match.groups()
+            hour = int(hour) % 12 + (12 if (meridiem or end_meridiem).lower() == "p" else 0)
+            if hour < 24 and int(minute or 0) < 60:
+                dt = dt.replace(hour=hour, minute=int(minute or 0))
+                blanked.append(time_match.span())
+        found.append((start, text[start:end], dt))
+
+    # Blank with spaces so offsets in the remaining text still line up with the original
+    pieces = []
+    pos = 0
+    for start, end in sorted(blanked):
+        pieces.append(text[pos:start])
+        pieces.append(" " * (end - start))
+        pos = end
+    pieces.append(text[pos:])
+    return found, "".join(pieces)
+
+
+def _search_dates(text: str, base_date: Optional[str] = None) -> List[Tuple[int, str, datetime]]:
+    """Find every date in text as (offset, matched_text, datetime), in text order.
+
+    Structured dates are read by _regex_search_dates; dateparser's much slower
+    search_dates then only has to handle what is left, such as "Mondays 2:00pm".
+    An offset of -1 means the match couldn't be located in the text.
     """
     settings = {"PREFER_DATES_FROM": "future"}
+    relative_base = datetime.now()
     if base_date:
-        settings["RELATIVE_BASE"] = base_date
+        relative_base = datetime.fromisoformat(base_date)
+        settings["RELATIVE_BASE"] = relative_base
 
-    # search_dates returns tuples (matched_text, datetime)
-    found = dateparser.search.search_dates(text, settings=settings, add_detected_language=False)
-    events = []
+    found, remaining = _regex_search_dates(text, relative_base)
+    if _TEMPORAL_RE.search(remaining):
+        # search_dates returns tuples (matched_text, datetime); matches come back
+        # in text order, so each search resumes after the previous match
+        pos = 0
+        for match_text, dt in dateparser.search.search_dates(
+            remaining, languages=DATEPARSER_LANGUAGES, settings=settings, add_detected_language=False
+        ) or ():
+            idx = remaining.find(match_text, pos)
+            if idx == -1:
+                idx = remaining.find(match_text)
+            else:
+                pos = idx + len(match_text)
+            found.append((idx, match_text, dt))
+    found.sort(key=lambda match: match[0])
+    return found
+
+
+def iter_events_from_text(text: str, base_date: Optional[str] = None) -> Iterator[Dict]:
+    """Yield event dicts from free text one at a time, as each date match is processed.
+
+    Yields events with keys: title, start (datetime), end (datetime), description, location
+
+    base_date: optional reference date for relative date parsing (ISO string) — passed to dateparser.
+    """
+    if not _TEMPORAL_RE.search(text):
+        return
+
+    found = _search_dates(text, base_date)
     if not found:
-        return events
+        return
+
+    line_starts = _line_starts(text)
 
     # To avoid duplicating overlapping matches, we'll iterate and create an event per match.
-    for match_text, dt in found:
+    seen = set()
+    for idx, match_text, dt in found:
         # find indices to extract context
-        idx = text.find(match_text)
         if idx == -1:
             title = match_text
         else:
-            title = _extract_sentence(text, idx, idx + len(match_text))
+            title = _extract_sentence(text, idx, idx + len(match_text), line_starts)
 
         # Heuristic: if title is long, clip to first clause
         if len(title) > 140:
             title = title.split(".")[0]
 
+        # The same date on the same line (e.g. a repeated schedule row) is one event
+        key = (match_text, title[:80])
+        if key in seen:
+            continue
+        seen.add(key)
+
         start = dt
         # If no explicit end time, default to 1 hour event
         end = start + timedelta(hours=1)
@@ -69,9 +519,71 @@ def extract_events_from_text(text: str, base_date: Optional[str] = None) -> List
             "description": title,
             "location": None,
         }
-        events.append(event)
+        yield event
 
-    return events
+
+def _response_cache_path(key: str) -> str:
+    return os.path.join(GEMINI_RESPONSE_CACHE_DIR, f"{key}.json")
+
+
+def _load_cached_response(key: str) -> Optional[str]:
+    """Return a cached Gemini response text, or None if missing or older than the TTL."""
+    path = _response_cache_path(key)
+    try:
+        if time.time() - os.path.getmtime(path) > GEMINI_RESPONSE_TTL:
+            os.remove(path)
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _save_cached_response(key: str, response_text: str) -> None:
+    """Atomically cache a Gemini response text; failures only cost a future cache miss."""
+    path = _response_cache_path(key)
+    tmp_path = None
+    try:
+        os.makedirs(GEMINI_RESPONSE_CACHE_DIR, exist_ok=True)
+        # Thread idents can repeat across worker processes, so let mkstemp pick the name
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=GEMINI_RESPONSE_CACHE_DIR)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(response_text)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log.debug("Could not cache Gemini response: %s", e)
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return
+    _sweep_cached_responses()
+
+
+def _sweep_cached_responses() -> None:
+    """Delete cached responses older than the TTL; most keys include a date and are never read again."""
+    cutoff = time.time() - GEMINI_RESPONSE_TTL
+    try:
+        with os.scandir(GEMINI_RESPONSE_CACHE_DIR) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except OSError:
+                    continue
+    except OSError as e:
+        log.debug("Could not sweep Gemini response cache: %s", e)
+
+
+def extract_events_from_text(text: str, base_date: Optional[str] = None) -> List[Dict]:
+    """Extract a list of event dicts from free text.
+
+    Returns events with keys: title, start (datetime), end (datetime), description, location
+
+    base_date: optional reference date for relative date parsing (ISO string) — passed to dateparser.
+    """
+    return list(iter_events_from_text(text, base_date))
 
 
 def extract_events_with_gemini(text: str, base_date: Optional[str] = None) -> List[Dict]:
@@ -82,158 +594,76 @@ def extract_events_with_gemini(text: str, base_date: Optional[str] = None) -> Li
     
     Returns events with keys: title, start (datetime), end (datetime), description, location
     """
+    global _last_good_model
     api_key = os.environ.get('GEMINI_API_KEY')
     
     if not api_key:
-        print("GEMINI_API_KEY not set, falling back to dateparser")
+        log.info("GEMINI_API_KEY not set, falling back to dateparser")
         return extract_events_from_text(text, base_date)
     
     try:
-        import google.generativeai as genai
-        
-        # Configure API - use stable v1 API instead of v1beta
-        genai.configure(api_key=api_key)
+        genai = load_genai()
         
-        # List available models to debug
-        try:
-            available_models = [m.name for m in genai.list_models()]
-            print(f"Available models: {available_models}")
-        except Exception as e:
-            print(f"Could not list models: {e}")
+        # Listing models is an extra API round trip, so only do it when debugging
+        if log.isEnabledFor(logging.DEBUG):
+            try:
+                available_models = [m.name for m in genai.list_models()]
+                log.debug("Available models: %s", available_models)
+            except Exception as e:
+                log.debug("Could not list models: %s", e)
         
         # Build the prompt
-        current_date = datetime.now().isoformat() if not base_date else base_date
-        prompt = f"""You are an expert at extracting calendar events from academic syllabi and course schedules.
-
-Extract all events, deadlines, exams, lectures, and important dates from the following text. The same event can be referenced in various parts of the text, each with some context. Make sure to group these events if you are sure they are the same
-
-STEPS
-- SCAN: Initially go through the text and note important names that refer to events or tasks, make sure to get anything accademically related
-- COLLECT: Collect info about events, grouping them by their names (make sure to distinguish seperate midterms)
-- COLLECT A SECOND TIME QUICKLY: make sure to not make duplicates
-- OUPUT: Output the events with enough info about them to be able to create a simple google calendar event
-
-CLASSIFY each item as either an "event" or "task":
-- EVENTS: Have specific start and end times (lectures, labs, discussions, exams, meetings, office hours)
-- TASKS: Only have due dates, no specific time needed (assignments, projects, homework, papers)
-
-Return a JSON array. Each item should have:
-- type: Either "event" or "task"
-- title: A short, descriptive title, do not include the date or time
-- start_text: The exact start date/time mentioned (keep original format) OR due date for tasks
-- end_text: The exact end date/time mentioned OR EXACTLY 1 HOUR AFTER start_text
-- location: Building name, room number, or "Online" if mentioned (usually empty for tasks)
-- description: For recurring events/tasks, include days of week (e.g., "Lecture MWF", "Lab TTH", "Assignment Monday"). For non-recurring: Category like "Lecture", "Lab", "Exam", "Discussion", "Assignment", "Project"
-- recurring: Boolean indicating if this event/task recurs (e.g., weekly lectures, weekly assignments, recurring meetings). Events/tasks for which there is not specified date but there is a day of the week (or multiple ex: M W (Every Monday and Wednesday)) are likely to be recurring
+        current_date = datetime.now().date().isoformat() if not base_date else base_date
+        # The rules go in the model's system instruction; only the date and text vary
+        prompt = "".join((
+            "Current date context: ", current_date,
+            "\n\nText to analyze:\n", text,
+            "\n\nReturn JSON array:",
+        ))
 
-Important rules:
-1. Use the text's actual date formats (don't convert to ISO unless necessary)
-2. For events without time, assume reasonable defaults (10am for classes, 3pm for exams)
-3. For tasks, use the due date as start_text and set end_text to "0"
-4. For recurring events or tasks, include days in description (e.g., "MWF", "TTH", "Monday Wednesday Friday", "Assignment Monday") so the recurrence pattern can be determined
-5. Return ONLY valid JSON, no markdown formatting
-6. Minimum event/task details: name, time, date
-
-Current date context: {current_date}
+        cache_key = hashlib.blake2b(
+            f"{EVENTS_PROMPT_VERSION}|{current_date}|{text}".encode(), digest_size=16
+        ).hexdigest()
+        response_text = _load_cached_response(cache_key)
+        if response_text is not None:
+            log.debug("Using cached Gemini response %s", cache_key)
+            # Structured output mode returns the JSON array directly
+            return convert_gemini_events(_json_loads(response_text))
 
-Text to analyze:
-{text}
-
-Return JSON array:"""
-
-        # Call Gemini API (using available models - free tier)
-        # Using models from the available list
-        model_names = [
-            'models/gemini-2.5-flash',  # Latest flash model
-            'models/gemini-2.0-flash',   # Stable flash model
-            'models/gemini-flash-latest', # Compatible version
-            'models/gemini-pro-latest',   # Pro version
-            'models/gemini-2.5-pro'       # Latest pro model
-        ]
-        
+        # Call Gemini API, starting with whichever model answered last time
+        model_names = sorted(TEXT_EVENT_MODELS, key=lambda name: name != _last_good_model)
+    
         response = None
         for model_name in model_names:
             try:
-                print(f"Trying model: {model_name}")
-                model = genai.GenerativeModel(model_name)
-                response = model.generate_content(prompt)
-                print(f"Successfully used {model_name}")
+                log.debug("Trying model: %s", model_name)
+                model = get_generative_model(model_name, EVENTS_RESPONSE_CONFIG, TEXT_EVENTS_PROMPT)
+                # Streaming fetches the first chunk here, so request errors still move on to the next model
+                response = model.generate_content(prompt, stream=True)
+                log.debug("Successfully used %s", model_name)
+                _last_good_model = model_name
                 break
             except Exception as model_error:
-                print(f"Model {model_name} failed: {model_error}")
+                log.warning("Model %s failed: %s", model_name, model_error)
                 continue
-        
+    
         if response is None:
             raise Exception("All Gemini models failed")
-        
-        # Extract JSON from response
-        response_text = response.text
-        
-        # Clean up the response (remove markdown code blocks if present)
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0]
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].split("```")[0]
-        
-        # Parse JSON
-        events_raw = json.loads(response_text.strip())
-        
-        # Convert to our format with proper datetime objects
-        events = []
-        for event_raw in events_raw:
-            try:
-                event_type = event_raw.get('type', 'event')
-                
-                # Parse start time
-                start_text = event_raw.get('start_text', '')
-                start_dt = dateparser.parse(start_text, settings={"PREFER_DATES_FROM": "future"})
-                
-                if not start_dt:
-                    continue  # Skip if we can't parse the date
-                
-                # Handle events vs tasks differently
-                if event_type == 'task':
-                    # Tasks are all-day events
-                    end_dt = start_dt
-                else:
-                    # Parse end time for events
-                    end_text = event_raw.get('end_text', '1 hour')
-                    if end_text == '0' or end_text.lower() == 'none':
-                        end_dt = start_dt  # All-day event
-                    elif 'hour' in end_text.lower() or 'hr' in end_text.lower():
-                        # Extract number of hours
-                        try:
-                            hours = float(''.join(filter(str.isdigit, end_text.split()[0])))
-                            end_dt = start_dt + timedelta(hours=hours)
-                        except:
-                            end_dt = start_dt + timedelta(hours=1)
-                    else:
-                        end_dt = dateparser.parse(end_text, settings={"PREFER_DATES_FROM": "future"})
-                        if not end_dt:
-                            end_dt = start_dt + timedelta(hours=1)
-                
-                # Get recurring flag (can be True for both events and tasks)
-                recurring = event_raw.get('recurring', False)
-                
-                event = {
-                    "title": event_raw.get('title', 'Event'),
-                    "start": start_dt,
-                    "end": end_dt,
-                    "description": event_raw.get('description', ''),
-                    "location": event_raw.get('location'),
-                    "type": event_type,
-                    "all_day": (event_type == 'task' or end_dt == start_dt),
-                    "recurring": recurring
-                }
-                events.append(event)
-            except Exception as e:
-                print(f"Error parsing event: {e}")
-                continue
-        
+
+        # Convert events as the response streams in, keeping its text for the cache
+        text_chunks = []
+
+        def response_chunks():
+            for chunk in stream_response_text(response):
+                text_chunks.append(chunk)
+                yield chunk
+
+        events = convert_gemini_events(iter_json_array(response_chunks()))
+        _save_cached_response(cache_key, "".join(text_chunks))
         return events
         
     except Exception as e:
-        print(f"Gemini API error: {e}, falling back to dateparser")
+        log.warning("Gemini API error: %s, falling back to dateparser", e)
         return extract_events_from_text(text, base_date)
 
 
@@ -0,0 +1,63 @@
+import os
+import unittest
+from datetime import datetime
+
+from parsers import extract_events_from_text
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+BASE_DATE = '2025-08-25'
+
+
+def read_example(name: str) -> str:
+    with open(os.path.join(EXAMPLES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def starts_by_title(text: str):
+    events = extract_events_from_text(text, BASE_DATE)
+    return {(event['title'], event['start']) for event in events}
+
+
+class ExtractEventsFromTextTests(unittest.TestCase):
+    def test_weekday_event_kept_next_to_structured_date(self):
+        titles = {title for title, _ in starts_by_title("Quiz on September 9, 2025 at 9:00am\nLab Monday at 3pm")}
+        self.assertEqual(titles, {"Quiz on September 9, 2025 at 9:00am", "Lab Monday at 3pm"})
+
+    def test_date_range_takes_year_after_range(self):
+        events = starts_by_title("Thanksgiving break: November 27-29, 2025")
+        self.assertIn(("Thanksgiving break: November 27-29, 2025", datetime(2025, 11, 27)), events)
+
+    def test_time_later_on_date_line(self):
+        events = starts_by_title("Wed Sep 3, 2025\tAssignment Homework 1\tdue by 8pm")
+        self.assertEqual({start for _, start in events}, {datetime(2025, 9, 3, 20, 0)})
+
+        events = starts_by_title("Friday, October 17 from 7-9pm")
+        self.assertIn(datetime(2025, 10, 17, 19, 0), {start for _, start in events})
+
+    def test_math55_keeps_time_only_lines(self):
+        titles = {title for title, _ in starts_by_title(read_example('math55_syllabus.txt'))}
+        self.assertTrue(any(title.startswith("Office hours: MW 11am-12:30pm") for title in titles))
+        self.assertTrue(any(title.startswith("Lectures MWF 2:10-3") for title in titles))
+
+    def test_math55_homework_deadlines(self):
+        events = starts_by_title(read_example('math55_syllabus.txt'))
+        self.assertIn(datetime(2025, 9, 3, 20, 0), {start for _, start in events})
+        self.assertIn(datetime(2025, 12, 18, 15, 0), {start for _, start in events})
+
+    def test_sample_syllabus_keeps_weekly_hours(self):
+        titles = {title for title, _ in starts_by_title(read_example('sample_syllabus.txt'))}
+        self.assertIn("- Mondays 2:00pm - 4:00pm", titles)
+        self.assertIn("- Wednesdays 10:00am - 12:00pm", titles)
+
+    def test_sample3_weekday_deadlines(self):
+        events = starts_by_title(read_example('sample3.txt'))
+        self.assertGreater(len(events), 40)
+        self.assertTrue(any("December 15" in title for title, _ in events))
+        # "... by Friday, 5 pm PT" is only found by search_dates
+        self.assertTrue(any(
+            title.startswith("Students in the self-service lab") and start.hour == 17 for title, start in events
+        ))
+
+
+if __name__ == '__main__':
+    unittest.main()